@@ -59,12 +59,13 @@ def get_source_files(src_dir: Path) -> List[Path]:
 
 def clean_content(content: str, pkg_name: str = "repomapper") -> str:
     """Clean up file content by removing imports and adjusting relative imports."""
-    # Remove any existing imports
+    # Remove any existing top-level imports. Nested ones (e.g. optional imports
+    # in try/except blocks) are kept so that their enclosing blocks stay valid.
     tree = ast.parse(content)
     lines = content.split("\n")
     import_lines = set()
 
-    for node in ast.walk(tree):
+    for node in tree.body:
         if isinstance(node, (ast.Import, ast.ImportFrom)):
             start = node.lineno - 1
             end = node.end_lineno if hasattr(node, "end_lineno") else start + 1
@@ -115,17 +116,21 @@ def combine_files(output_file: Path, pkg_name: str = "repomapper"):
         "",
         "import ast",
         "import argparse",
+        "import functools",
+        "import itertools",
         "import json",
         "import os",
+        "import queue",
         "import re",
         "import subprocess",
         "import sys",
         "from abc import ABC, abstractmethod",
         "from collections import defaultdict",
-        "from dataclasses import dataclass",
+        "from concurrent.futures import ThreadPoolExecutor",
+        "from dataclasses import dataclass, field",
         "from enum import Enum",
         "from pathlib import Path",
-        "from typing import Dict, List, Optional, Set, Tuple, TypedDict, NamedTuple",
+        "from typing import Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple, TypedDict, NamedTuple, Union",
         "",
         "from dataclasses import dataclass",
         "",
@@ -138,13 +143,13 @@ def combine_files(output_file: Path, pkg_name: str = "repomapper"):
             0
             if f.name == "types.py"
             else 1
-            if f.name in {"symbols.py", "handlers/base.py"}
+            if f.name == "symbols.py"
             else 2
             if f.name == "ignore.py"
             else 3
-            if f.name == "core.py"
+            if "handlers" in str(f)  # base.py sorts first by name
             else 4
-            if "handlers" in str(f)
+            if f.name == "core.py"
             else 5,
             f.name,
         ),
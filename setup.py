@@ -8,6 +8,10 @@ setup(
     install_requires=[
         "pytest>=7.2.1",
     ],
+    extras_require={
+        "fast": ["orjson", "google-re2"],
+        "watch": ["watchdog"],
+    },
     entry_points={
         "console_scripts": [
             "repomapper=repomapper.cli:main",
@@ -1,7 +1,6 @@
 """Command line interface for the code map generator."""
 
 import argparse
-import os
 import sys
 from pathlib import Path
 from .core import CodeMapper
@@ -44,6 +43,11 @@ def parse_args():
         action="store_true",
         help="when used with --list, also show excluded files",
     )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="keep updating the map as files change (requires watchdog)",
+    )
     return parser.parse_args()
 
 
@@ -60,59 +64,20 @@ def main():
     mapper = CodeMapper(debug=args.debug)
 
     if args.list:
-        # Initialize exactly as generate_map() does
-        mapper.output_file = None
-        mapper.ignore_manager = IgnorePatternManager(directory)
-
-        if args.debug:
-            print("DEBUG: IgnoreManager initialized", file=sys.stderr)
-            if mapper.ignore_manager.git_root:
-                print(
-                    f"DEBUG: Git root found at: {mapper.ignore_manager.git_root}",
-                    file=sys.stderr,
-                )
-            else:
-                print("DEBUG: No git root found", file=sys.stderr)
-            print("DEBUG: Running ctags...", file=sys.stderr)
-
-        mapper._run_ctags(directory)
-        processable = mapper._get_processable_files(directory)
+        mapper.list_files(directory, show_all=args.all)
+        return
 
-        if args.all:
-            # Walk through all files
-            for root, _, files in os.walk(directory):
-                if args.debug:
-                    print(f"DEBUG: Walking directory: {root}", file=sys.stderr)
-                    print(f"DEBUG: Found files: {files}", file=sys.stderr)
-                for file in files:
-                    path = (Path(root) / file).resolve()
-                    try:
-                        # Use git root if available, otherwise use directory
-                        base = (
-                            mapper.ignore_manager.git_root
-                            if mapper.ignore_manager.git_root
-                            else directory
-                        )
-                        rel_path = path.relative_to(base)
-                        status = "I" if path in processable else "."
-                        print(f"{status} {rel_path}")
-                    except ValueError:
-                        print(f"E {path}")
-                        continue
-        else:
-            # Just show included files
-            for path in sorted(processable):
-                try:
-                    # Use git root if available, otherwise use directory
-                    base = (
-                        mapper.ignore_manager.git_root
-                        if mapper.ignore_manager.git_root
-                        else directory
-                    )
-                    rel_path = path.relative_to(base)
-                    print(rel_path)
-                except ValueError:
-                    continue
+    if args.watch:
+        if args.output == "-":
+            print("Error: --watch needs an output file", file=sys.stderr)
+            sys.exit(1)
+        output_file = Path(args.output)
+        if not output_file.is_absolute():
+            # Relative to git root or cwd, as below; watch() collects the
+            # ignore patterns itself
+            git_root = IgnorePatternManager(directory, scan_tree=False).git_root
+            output_file = (git_root or Path.cwd()) / output_file
+        mapper.watch(directory, output_file.resolve())
         return
 
     if args.output == "-":
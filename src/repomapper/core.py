@@ -1,12 +1,14 @@
 """Core CodeMapper class"""
 
-import json
+import functools
 import os
+import queue
 import re
 import subprocess
 import sys
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Optional, Set
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
 from .symbols import Symbol, SymbolTree
 from .ignore import IgnorePatternManager
 from .types import CtagEntry, ProcessDecision
@@ -18,6 +20,167 @@ from .handlers import (
     ShellHandler,
 )
 
+try:
+    from orjson import loads as json_loads
+except ImportError:  # orjson is optional, fall back to the standard library
+    from json import loads as json_loads
+
+# ctags options shared by the recursive run and the --watch filter process
+_CTAGS_OPTIONS = [
+    "--output-format=json",
+    # Only the fields the handlers read: name, input file, pattern, kind
+    # (long name), line, scope (with its kind), signature, access,
+    # roles and typeref. Smaller JSON lines are faster to parse.
+    "--fields=NFPKnsSart",
+    "--extras=*",
+    "--kinds-Python=+vm",  # Include variables and class members
+]
+
+# Line ctags --filter prints after the entries of each file
+_FILTER_TERMINATOR = b"###END###\n"
+
+# Files which change what is ignored, see IgnorePatternManager
+_IGNORE_FILES = {".gitignore", ".mapignore"}
+
+# Filesystem events which can change the map in --watch mode
+_WATCHED_EVENTS = {"created", "deleted", "modified", "moved"}
+
+# Seconds without events before --watch updates the map
+_WATCH_SETTLE = 0.2
+
+# Description cleanups applied to every symbol in _write_map()
+_RE_TRAILING_COMMENT = re.compile(r"\s*[#//].*$")
+_RE_INHERITS = re.compile(r"\(inherits from: .*?\)")
+_RE_OPTIONAL = re.compile(r": Optional\[(.*?)\]")
+_RE_LIST = re.compile(r": List\[(.*?)\]")
+_RE_DICT = re.compile(r": Dict\[(.*?),(.*?)\]")
+
+
+def _format_symbol(symbol: Symbol) -> str:
+    """Format a symbol's line in the map, without indentation."""
+    desc = symbol.pattern.strip()
+    if symbol.signature:
+        desc = symbol.signature
+
+    # Clean up trailing comments
+    desc = _RE_TRAILING_COMMENT.sub("", desc.rstrip())
+
+    # Clean up type hints
+    desc = _RE_INHERITS.sub("", desc)
+    desc = _RE_OPTIONAL.sub(r"?: \1", desc)  # Optional[T] -> T?
+    desc = _RE_LIST.sub(r": \1[]", desc)  # List[T] -> T[]
+    desc = _RE_DICT.sub(r": {\1: \2}", desc)  # Dict[K,V] -> {K: V}
+
+    # Show inheritance if present
+    if symbol.inherits_from:
+        desc = f"{desc} inherits from {', '.join(symbol.inherits_from)}"
+
+    # Don't show duplicated name in description if it matches the symbol name
+    if desc.startswith(f"{symbol.name}:"):
+        desc = desc[len(symbol.name) + 1 :].strip()
+
+    # Handle fully qualified names (e.g. Symbol.scope vs scope)
+    simple_name = symbol.name.split(".")[-1] if "." in symbol.name else symbol.name
+
+    return f"({symbol.line}) {simple_name}: {desc}"
+
+
+@functools.lru_cache(maxsize=None)
+def _symbol_category(kind: str, has_parent: bool, is_upper: bool) -> str:
+    """Map a symbol's kind and properties to its category, see CodeMapper."""
+    if kind in {"class", "struct", "interface", "c"}:
+        return "Classes"
+    elif kind in {"function", "f"}:
+        if has_parent:  # Method of a class
+            return "Methods"
+        return "Functions"
+    elif kind in {"variable", "field", "v"}:
+        if has_parent:  # Class member
+            return "Class Variables"
+        elif is_upper:  # Constants
+            return "Constants"
+        return "Variables"
+    elif kind in {"namespace", "package", "module", "i"}:
+        return "Modules"
+
+    return kind.title()
+
+
+# Entry values repeated across many entries (path across those of a file)
+_INTERNED_FIELDS = ("kind", "scope", "scopeKind", "language", "path")
+
+
+def _intern_entry(entry: CtagEntry) -> CtagEntry:
+    """Intern an entry's repeated values, so equal ones share a string.
+
+    Each parsed entry would otherwise hold its own copies: interning saves
+    memory and the hash of each value is computed once for all lookups.
+    """
+    for key in _INTERNED_FIELDS:
+        if isinstance(value := entry.get(key), str):
+            entry[key] = sys.intern(value)
+    return entry
+
+
+def _ctags_failed(returncode: int, cmd: List[str]) -> None:
+    """Report a ctags failure and exit."""
+    e = subprocess.CalledProcessError(returncode, cmd)
+    print(f"Error running ctags: {e}", file=sys.stderr)
+    sys.exit(1)
+
+
+class _CtagsFilter:
+    """A persistent ctags process which tags one file at a time.
+
+    ctags runs in --filter mode: each path written to its input is answered
+    with the file's entries, then a terminator line. This saves a ctags spawn
+    and a parse of the whole tree for every change in --watch mode.
+    """
+
+    def __init__(self):
+        self.cmd = [
+            "ctags",
+            *_CTAGS_OPTIONS,
+            "--filter",
+            f"--filter-terminator={_FILTER_TERMINATOR.decode()}",
+        ]
+        self.proc = subprocess.Popen(
+            self.cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def tag_file(self, path: str) -> List[CtagEntry]:
+        """Get the entries of a single file."""
+        entries = []
+        try:
+            self.proc.stdin.write(os.fsencode(path) + b"\n")
+            self.proc.stdin.flush()
+            for line in iter(self.proc.stdout.readline, _FILTER_TERMINATOR):
+                if not line:  # ctags exited
+                    break
+                if line.strip():
+                    entries.append(_intern_entry(json_loads(line)))
+            else:
+                return entries
+        except BrokenPipeError:
+            pass
+        returncode = self.proc.wait()
+        if returncode:
+            _ctags_failed(returncode, self.cmd)
+        # A status of 0 is no failure to report: the answer is what's missing
+        print(
+            f"Error running ctags: ctags exited before answering {path}",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+    def close(self) -> None:
+        """Let ctags exit once its input ends."""
+        self.proc.stdin.close()
+        self.proc.wait()
+
 
 class CodeMapper:
     """Main class for generating code maps."""
@@ -31,46 +194,136 @@ class CodeMapper:
             "Markdown": MarkdownHandler(),
         }
         self.processed_files: Set[Path] = set()
+        # Handler chosen for each processable file, see _get_processable_files()
+        self.file_handlers: Dict[str, LanguageHandler] = {}
         self.ignore_manager: Optional[IgnorePatternManager] = None
         # Symbol tree for each file
         self.file_trees: Dict[Path, SymbolTree] = {}
 
-    def _run_ctags(self, directory: Path) -> List[CtagEntry]:
-        """Run ctags and get JSON output."""
+    def _run_ctags(self, directory: Path) -> Iterator[CtagEntry]:
+        """Run ctags and yield entries from its JSON output as they arrive."""
         cmd = [
             "ctags",
-            "--output-format=json",
-            "--fields=*",
-            "--fields=+S",  # Ensure scope field is included for Python
-            "--extras=*",
-            "--kinds-Python=+vm",  # Include variables and class members
+            *_CTAGS_OPTIONS,
             "-R",
-            str(directory),
+            # Resolved like _iter_files(), for paths that match without resolve()
+            str(directory.resolve()),
         ]
 
-        try:
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        # Stream stdout so parsing overlaps with ctags and the whole output
+        # is never held in memory. Stderr is discarded (as it was captured and
+        # never shown before), which also avoids a full stderr pipe blocking it.
+        # Lines are kept as bytes: both orjson and json parse them directly.
+        with subprocess.Popen(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        ) as proc:
             # Parse JSON lines (one JSON object per line)
-            entries = []
-            for line in result.stdout.splitlines():
+            for line in proc.stdout:
                 if line.strip():
-                    entries.append(json.loads(line))
-            return entries
-        except subprocess.CalledProcessError as e:
-            print(f"Error running ctags: {e}", file=sys.stderr)
-            sys.exit(1)
+                    yield _intern_entry(json_loads(line))
+
+        if proc.returncode:
+            _ctags_failed(proc.returncode, cmd)
 
     def _get_file_info(self, file_path: Path) -> str:
         """Get file metadata."""
         try:
-            line_count = sum(1 for _ in file_path.open())
+            # Count newlines in binary chunks: no decoding, no per-line objects
+            line_count = 0
+            last = b"\n"
+            with file_path.open("rb") as f:
+                while chunk := f.read(1 << 16):
+                    line_count += chunk.count(b"\n")
+                    last = chunk[-1:]
+            if last != b"\n":  # Last line has no trailing newline
+                line_count += 1
             return f"  Size: {line_count} lines"
         except Exception as e:
             return f"  Error reading file: {e}"
 
-    def _get_processable_files(self, directory: Path) -> Set[Path]:
+    def _iter_files(
+        self, directory: Union[str, Path], skip_ignored: bool = False
+    ) -> Iterator[str]:
+        """Yield the paths of all non-hidden files under directory.
+
+        Hidden entries (starting with .) are skipped at the directory boundary,
+        so their subtrees are never read. File types come from the cached
+        os.scandir() entries instead of a stat() per file. Symlinked
+        directories are not followed, as with os.walk().
+
+        Args:
+            directory: Directory to walk
+            skip_ignored: Also prune directories excluded by ignore patterns,
+                reporting each directory listed to the ignore manager so it
+                can read ignore files as they are found (see on_dir())
+        """
+        root = os.fspath(Path(directory).resolve())
+
+        # Directory paths relative to git root, None when not pruning
+        rel_root = None
+        if skip_ignored and self.ignore_manager and self.ignore_manager.git_root:
+            rel_root = os.path.relpath(root, self.ignore_manager.git_root)
+            if rel_root == os.pardir or rel_root.startswith(os.pardir + os.sep):
+                rel_root = None
+
+        pending = [(root, rel_root)]
+        while pending:
+            current, rel_current = pending.pop()
+            try:
+                with os.scandir(current) as it:
+                    entries = list(it)
+                if rel_current is not None:
+                    # This directory's ignore files apply to its entries
+                    self.ignore_manager.on_dir(current, entries)
+                for entry in entries:
+                    if entry.name.startswith("."):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        rel_dir = None
+                        if rel_current is not None:
+                            rel_dir = (
+                                entry.name
+                                if rel_current == "."
+                                else f"{rel_current}/{entry.name}"
+                            )
+                            if self.ignore_manager.should_ignore_dir(rel_dir):
+                                continue
+                        pending.append((entry.path, rel_dir))
+                    elif entry.is_file():
+                        yield entry.path
+            except OSError:
+                # Unreadable directories are skipped, as os.walk() does
+                continue
+
+    def _find_handler(self, file_path: Path) -> Optional[LanguageHandler]:
+        """Find the handler that will process a file.
+
+        Returns:
+            The first language handler to accept the file, else the generic
+            handler if it does, or None if the file is skipped or unhandled.
+        """
+        for handler in self.handlers.values():
+            decision = handler.should_process_file(file_path)
+            if decision == ProcessDecision.PROCESS:
+                return handler
+            elif decision == ProcessDecision.SKIP:
+                return None
+
+        decision = self.generic_handler.should_process_file(file_path)
+        if decision == ProcessDecision.PROCESS:
+            return self.generic_handler
+        return None
+
+    def _get_processable_files(self, directory: Path) -> Dict[str, LanguageHandler]:
         """Get all files that can be processed by our handlers.
 
+        The result maps each file to the handler that processes it, and is
+        also kept as self.file_handlers.
+
+        Paths are absolute strings under the resolved directory, as ctags
+        reports them, so entries are looked up without building Path objects.
+        Symlinked files are not resolved to their targets.
+
         Files are filtered based on:
         1. Hidden files/directories (starting with .)
         2. Patterns from .gitignore and .mapignore files
@@ -81,56 +334,38 @@ class CodeMapper:
             use_ignore_patterns = False
         else:
             use_ignore_patterns = True
-            git_root = self.ignore_manager.git_root
-
-        files = set()
-        for root, _, filenames in os.walk(directory):
-            root_path = Path(root)
-            # Skip hidden directories
-            if any(part.startswith(".") for part in root_path.parts):
+            # Walked paths are already canonical, so relative paths are a slice
+            git_root_prefix = os.path.join(os.fspath(self.ignore_manager.git_root), "")
+
+        # Skip the output file itself if it's a path (not stdout or -)
+        output_name = output_path = None
+        if (
+            (output_file := getattr(self, "output_file", None))
+            and isinstance(output_file, (str, Path))
+            and output_file != "-"
+        ):
+            output_name = Path(output_file).name
+            output_path = Path(output_file).resolve()
+
+        files: Dict[str, LanguageHandler] = {}
+        for path in self._iter_files(directory, skip_ignored=True):
+            # Only a file with the same name could be the output file
+            if (
+                output_name is not None
+                and os.path.basename(path) == output_name
+                and Path(path).resolve() == output_path
+            ):
                 continue
 
-            for filename in filenames:
-                # Skip hidden files
-                if filename.startswith("."):
+            if use_ignore_patterns and path.startswith(git_root_prefix):
+                rel_path = path[len(git_root_prefix) :]
+                if self.ignore_manager.should_ignore(rel_path):
                     continue
 
-                file_path = (root_path / filename).resolve()
-
-                # Skip the output file itself if it's a path (not stdout or -)
-                if (
-                    (output_file := getattr(self, "output_file", None))
-                    and isinstance(output_file, (str, Path))
-                    and output_file != "-"
-                ):
-                    if Path(filename) == Path(output_file).name:
-                        continue
-                    if file_path == Path(output_file).resolve():
-                        continue
+            if handler := self._find_handler(Path(path)):
+                files[path] = handler
 
-                if use_ignore_patterns:
-                    try:
-                        rel_path = file_path.relative_to(git_root)
-                        if self.ignore_manager.should_ignore(rel_path):
-                            continue
-                    except ValueError:
-                        # If file is not under git_root, skip ignore pattern check
-                        pass
-                handled = False
-                for handler in self.handlers.values():
-                    decision = handler.should_process_file(file_path)
-                    if decision == ProcessDecision.PROCESS:
-                        files.add(file_path)
-                        handled = True
-                        break
-                    elif decision == ProcessDecision.SKIP:
-                        handled = True
-                        break
-
-                if not handled:
-                    decision = self.generic_handler.should_process_file(file_path)
-                    if decision == ProcessDecision.PROCESS:
-                        files.add(file_path)
+        self.file_handlers = files
         return files
 
     def _setup_output_file(self, output_path: str) -> Path:
@@ -167,25 +402,146 @@ class CodeMapper:
             output_path: Path to output file if output_file is None
         """
         self.output_file = output_file
-        self.ignore_manager = IgnorePatternManager(directory)
-        entries = self._run_ctags(directory)
-        all_files = self._get_processable_files(directory)
+        all_files, entries = self._collect(directory)
+        self._build_map(entries, all_files, output_file, output_path)
+
+    def list_files(self, directory: Path, show_all=False, output=None):
+        """List the files that would be included in the map.
+
+        Paths are relative to the git root if any, else to directory.
+
+        Args:
+            directory: Directory to analyze
+            show_all: Also list excluded files, each prefixed with I if
+                included or . if not
+            output: File object to write to, defaults to sys.stdout
+        """
+        output = output or sys.stdout
+        # Initialize exactly as generate_map() does
+        self.output_file = None
+        self.ignore_manager = IgnorePatternManager(directory, scan_tree=False)
+
+        if self.debug:
+            print("DEBUG: IgnoreManager initialized", file=sys.stderr)
+            if self.ignore_manager.git_root:
+                print(
+                    f"DEBUG: Git root found at: {self.ignore_manager.git_root}",
+                    file=sys.stderr,
+                )
+            else:
+                print("DEBUG: No git root found", file=sys.stderr)
+
+        processable = self._get_processable_files(directory)
+
+        # Use git root if available, otherwise use directory
+        base = self.ignore_manager.git_root or directory
+        if show_all:
+            # Walk through all (non-hidden) files
+            for file in self._iter_files(directory):
+                if self.debug:
+                    print(f"DEBUG: Found file: {file}", file=sys.stderr)
+                path = Path(file)
+                try:
+                    rel_path = path.relative_to(base)
+                    status = "I" if file in processable else "."
+                    print(f"{status} {rel_path}", file=output)
+                except ValueError:
+                    print(f"E {path}", file=output)
+        else:
+            # Just show included files
+            for path in sorted(map(Path, processable)):
+                try:
+                    print(path.relative_to(base), file=output)
+                except ValueError:
+                    continue
+
+    def _collect(
+        self, directory: Path
+    ) -> Tuple[Dict[str, LanguageHandler], List[CtagEntry]]:
+        """Find processable files and run ctags on a directory.
+
+        Returns:
+            The processable files (see _get_processable_files()) and the
+            ctags entries of those files
+        """
+        if (
+            self.ignore_manager is None
+            or self.ignore_manager.start_path != directory.resolve()
+        ):
+            # Ignore files below directory are found by our own walk
+            self.ignore_manager = IgnorePatternManager(directory, scan_tree=False)
+        else:
+            # Keep decisions cached by a previous run unless ignore files changed
+            self.ignore_manager.refresh()
+        # ctags walks the tree in its own process: drain it from a thread
+        # while our walk runs, instead of leaving one idle behind the other
+        walk: "Future[Dict[str, LanguageHandler]]" = Future()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            ctags_future = executor.submit(self._tagged_entries, directory, walk)
+            try:
+                all_files = self._get_processable_files(directory)
+            except BaseException as e:
+                walk.set_exception(e)
+                raise
+            walk.set_result(all_files)
+            entries = ctags_future.result()
+        return all_files, entries
+
+    def _tagged_entries(
+        self, directory: Path, walk: "Future[Dict[str, LanguageHandler]]"
+    ) -> List[CtagEntry]:
+        """Run ctags on a directory, keeping the entries of processable files.
+
+        Entries which arrive before the walk ends are held until its files
+        are known, then those of files it dropped are released.
+
+        Args:
+            directory: Directory to analyze
+            walk: Processable files, as found by the concurrent walk
+        """
+        entries: List[CtagEntry] = []
+        files = None
+        for entry in self._run_ctags(directory):
+            if files is None and walk.done():
+                files = walk.result()
+                entries = [e for e in entries if e.get("path") in files]
+            if files is None or entry.get("path") in files:
+                entries.append(entry)
+        if files is None:
+            files = walk.result()
+            entries = [e for e in entries if e.get("path") in files]
+        return entries
+
+    def _build_map(
+        self,
+        entries: Iterable[CtagEntry],
+        all_files: Dict[str, LanguageHandler],
+        output_file=None,
+        output_path="MAP.txt",
+    ):
+        """Build symbols from ctags entries and write the map.
+
+        Args:
+            entries: ctags entries, those of files not in all_files are skipped
+            all_files: Processable files, see _get_processable_files()
+            output_file: File object to write to, or None to create a new file
+            output_path: Path to output file if output_file is None
+        """
+        # Symbol trees are rebuilt from scratch on each run
+        self.file_trees = {}
 
         # Group entries by file and module path
-        files_dict: Dict[Path, Dict[str, Dict[str, List[Symbol]]]] = {}
+        files_dict: Dict[str, Dict[str, Dict[str, List[Symbol]]]] = {}
 
         for file_path in all_files:
             files_dict[file_path] = {}
+        trees: Dict[str, SymbolTree] = {}
 
         for entry in entries:
-            file_path = Path(entry["path"]).resolve()
-            if not file_path.exists() or file_path not in all_files:
-                continue
-
-            language = entry.get("language")
-            handler = self.handlers.get(language, self.generic_handler)
-
-            if not handler.should_process_file(file_path):
+            # ctags walks the same resolved directory, so its paths match ours
+            file_path = entry["path"]
+            handler = all_files.get(file_path)
+            if handler is None:
                 continue
 
             if not handler.filter_symbol(entry):
@@ -218,13 +574,17 @@ class CodeMapper:
                 inherits_from=inherits_from,
             )
 
-            # Initialize symbol tree for this file if needed
-            if file_path not in self.file_trees:
-                self.file_trees[file_path] = SymbolTree()
+            # Initialize symbol tree for this file if needed (file_trees is
+            # keyed by Path, so only build one per file, not per entry)
+            tree = trees.get(file_path)
+            if tree is None:
+                tree = trees[file_path] = self.file_trees[
+                    Path(file_path)
+                ] = SymbolTree()
 
             # Add symbol to tree with proper scope
             scope = entry.get("scope")
-            self.file_trees[file_path].add_symbol(symbol, scope)
+            tree.add_symbol(symbol, scope)
 
             # Also maintain the old structure for now
             if module_path not in files_dict[file_path]:
@@ -242,194 +602,333 @@ class CodeMapper:
             with output_file.open("w") as f:
                 self._write_map(f, files_dict)
 
+    def watch(self, directory: Path, output_file: Path):
+        """Write the map, then update it whenever files change, until interrupted.
+
+        ctags entries are kept for each file, so that only changed files are
+        tagged again, by a persistent ctags process (see _CtagsFilter).
+
+        Args:
+            directory: Directory to analyze
+            output_file: Absolute path of the map file
+        """
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            print(
+                "Error: --watch requires watchdog (pip install watchdog)",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+
+        self.output_file = output_file
+        all_files, entries = self._collect(directory)
+        entries_by_file: Dict[str, List[CtagEntry]] = {path: [] for path in all_files}
+        for entry in entries:
+            if (file_entries := entries_by_file.get(entry["path"])) is not None:
+                file_entries.append(entry)
+
+        def write_map():
+            with output_file.open("w") as f:
+                self._build_map(
+                    (
+                        entry
+                        for file_entries in entries_by_file.values()
+                        for entry in file_entries
+                    ),
+                    self.file_handlers,
+                    f,
+                )
+            print(f"Created/updated: {output_file}")
+
+        root = os.path.join(str(directory.resolve()), "")
+        skipped = {os.fspath(output_file), os.fspath(output_file) + "~"}
+        # Changed paths, with whether the set of files may have changed
+        changes: "queue.Queue[Tuple[str, bool]]" = queue.Queue()
+
+        class ChangeHandler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.event_type not in _WATCHED_EVENTS:
+                    return
+                rewalk = event.event_type != "modified"
+                if event.is_directory and not rewalk:
+                    return
+                for path in (event.src_path, getattr(event, "dest_path", "")):
+                    if not path or path in skipped or not path.startswith(root):
+                        continue
+                    # Hidden entries are never mapped, except for ignore files
+                    *dirs, name = path[len(root) :].split(os.sep)
+                    if any(part.startswith(".") for part in dirs) or (
+                        name.startswith(".") and name not in _IGNORE_FILES
+                    ):
+                        continue
+                    changes.put((path, rewalk))
+
+        write_map()
+        ctags = _CtagsFilter()
+        observer = Observer()
+        observer.schedule(ChangeHandler(), root, recursive=True)
+        observer.start()
+        try:
+            while True:
+                changed: Set[str] = set()
+                rewalk = False
+                path, walk = changes.get()
+                # Let a burst of events (e.g. a checkout) settle into one update
+                while True:
+                    changed.add(path)
+                    rewalk = rewalk or walk
+                    try:
+                        path, walk = changes.get(timeout=_WATCH_SETTLE)
+                    except queue.Empty:
+                        break
+                if self._update_entries(
+                    directory, changed, rewalk, entries_by_file, ctags.tag_file
+                ):
+                    write_map()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            observer.stop()
+            observer.join()
+            ctags.close()
+
+    def _update_entries(
+        self,
+        directory: Path,
+        changed: Set[str],
+        rewalk: bool,
+        entries_by_file: Dict[str, List[CtagEntry]],
+        tag_file: Callable[[str], List[CtagEntry]],
+    ) -> bool:
+        """Bring the ctags entries kept by watch() up to date.
+
+        Args:
+            directory: Directory to analyze
+            changed: Absolute paths of files and directories which changed
+            rewalk: Whether files may have been created, deleted or renamed
+            entries_by_file: Entries of each processable file, updated in place
+            tag_file: Function returning the entries of a single file
+
+        Returns:
+            True if any file's entries changed
+        """
+        if any(os.path.basename(path) in _IGNORE_FILES for path in changed):
+            # Rebuilt rather than refreshed, to also find new ignore files
+            self.ignore_manager = IgnorePatternManager(directory, scan_tree=False)
+            rewalk = True
+        if rewalk:
+            all_files = self._get_processable_files(directory)
+        else:
+            all_files = self.file_handlers
+
+        updated = False
+        for path in [path for path in entries_by_file if path not in all_files]:
+            del entries_by_file[path]
+            updated = True
+        for path in all_files:
+            if path in changed or path not in entries_by_file:
+                entries_by_file[path] = tag_file(path)
+                updated = True
+        return updated
+
     def _get_symbol_category(self, symbol: Symbol) -> str:
         """Determine the category for a symbol based on its kind and properties."""
-        kind = symbol.kind
-
-        if kind in {"class", "struct", "interface", "c"}:
-            return "Classes"
-        elif kind in {"function", "f"}:
-            if symbol.parent:  # Method of a class
-                return "Methods"
-            return "Functions"
-        elif kind in {"variable", "field", "v"}:
-            if symbol.parent:  # Class member
-                return "Class Variables"
-            elif symbol.name.isupper():  # Constants
-                return "Constants"
-            return "Variables"
-        elif kind in {"namespace", "package", "module", "i"}:
-            return "Modules"
-
-        return kind.title()
+        return _symbol_category(
+            symbol.kind, symbol.parent is not None, symbol.name.isupper()
+        )
+
+    def _find_duplicate_children(self, symbol: Symbol) -> Set[int]:
+        """Find the ids of children that duplicate one of their siblings.
+
+        A child duplicates a sibling with the same base name and kind and the
+        same pattern or signature. Enum members are never duplicates. Children
+        are bucketed by (base name, kind) so only actual candidates get compared.
+        """
+        is_enum = symbol.kind == "class" and "enum" in symbol.pattern.lower()
+
+        candidates: Dict[Tuple[str, str], List[Symbol]] = {}
+        for child in symbol.children:
+            if is_enum and child.kind == "variable":
+                continue
+            key = (child.name.split(".")[-1], child.kind)
+            candidates.setdefault(key, []).append(child)
+
+        duplicates = set()
+        for group in candidates.values():
+            if len(group) < 2:
+                continue
+            for child in group:
+                for sibling in group:
+                    if sibling == child:  # Skip self-comparison
+                        continue
+                    if (
+                        sibling.pattern == child.pattern
+                        or sibling.signature == child.signature
+                    ):
+                        duplicates.add(id(child))
+                        break
+        return duplicates
 
     def _write_map(self, output, files_dict):
-        """Write the map to the given output file object."""
-        print(
+        """Write the map to the given output file object.
+
+        File sections are rendered concurrently on a thread pool (rendering
+        also reads each file for its line count and Markdown headers), then
+        written in order with a single write per file.
+        """
+        output.write(
             """# This file was automatically generated. Do not edit manually.
 # See: https://github.com/vphantom/repomapper
 #
-# Each section describes a file and each line begins with (line_number).""",
-            file=output,
+# Each section describes a file and each line begins with (line_number).
+"""
         )
 
-        def write_symbol_tree(symbol: Symbol, indent_level: int = 0) -> None:
-            """Recursively write a symbol and its children."""
-            # Check for duplicates before doing anything else
-            if symbol.parent is not None:
-                # Skip duplicate detection for enum members
-                is_enum_member = (
-                    symbol.parent.kind == "class"
-                    and "enum" in symbol.parent.pattern.lower()
-                    and symbol.kind == "variable"
-                )
+        # Resolved once here, used to skip headers for the map file itself
+        output_path = Path(output.name).resolve() if hasattr(output, "name") else None
 
-                if not is_enum_member:
-                    base_name = symbol.name.split(".")[-1]
+        # Sorted as paths (component-wise), not as plain strings
+        files = {Path(path): modules for path, modules in files_dict.items()}
 
-                    for sibling in symbol.parent.children:
-                        if sibling == symbol:  # Skip self-comparison
-                            continue
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            sections = executor.map(
+                lambda file_path: self._render_file(
+                    file_path, files[file_path], output_path
+                ),
+                sorted(files.keys()),
+            )
+            for section in sections:
+                output.write(section)
 
-                        sibling_base = sibling.name.split(".")[-1]
-                        is_duplicate = (
-                            sibling_base == base_name
-                            and sibling.kind == symbol.kind
-                            and (
-                                sibling.pattern == symbol.pattern
-                                or sibling.signature == symbol.signature
-                            )
-                        )
+    def _render_file(
+        self,
+        file_path: Path,
+        modules: Dict[str, Dict[str, List[Symbol]]],
+        output_path: Optional[Path],
+    ) -> str:
+        """Render the map section of a single file.
 
-                        if is_duplicate:
-                            return
+        Args:
+            file_path: File to render
+            modules: Symbols of this file by module path, then category
+            output_path: Resolved path of the map file, None if not a file
 
-            indent = "  " * indent_level
-            desc = symbol.pattern.strip()
-            if symbol.signature:
-                desc = symbol.signature
-
-            # Clean up trailing comments
-            desc = re.sub(r"\s*[#//].*$", "", desc.rstrip())
-
-            # Clean up type hints
-            desc = re.sub(r"\(inherits from: .*?\)", "", desc)
-            desc = re.sub(r": Optional\[(.*?)\]", r"?: \1", desc)  # Optional[T] -> T?
-            desc = re.sub(r": List\[(.*?)\]", r": \1[]", desc)  # List[T] -> T[]
-            desc = re.sub(
-                r": Dict\[(.*?),(.*?)\]", r": {\1: \2}", desc
-            )  # Dict[K,V] -> {K: V}
-
-            # Show inheritance if present
-            if symbol.inherits_from:
-                desc = f"{desc} inherits from {', '.join(symbol.inherits_from)}"
-
-            # Don't show duplicated name in description if it matches the symbol name
-            if desc.startswith(f"{symbol.name}:"):
-                desc = desc[len(symbol.name) + 1 :].strip()
-
-            # Handle fully qualified names (e.g. Symbol.scope vs scope)
-            simple_name = (
-                symbol.name.split(".")[-1] if "." in symbol.name else symbol.name
-            )
+        Returns:
+            The section text, empty if there is nothing to show
+        """
+        # Children to skip as duplicates of a sibling, computed once per parent
+        duplicates_by_parent: Dict[int, Set[int]] = {}
 
-            print(f"{indent}({symbol.line}) {simple_name}: {desc}", file=output)
+        def write_symbol_tree(
+            symbol: Symbol, lines: List[str], indent_level: int = 0
+        ) -> None:
+            """Recursively write a symbol and its children to lines."""
+            # Check for duplicates before doing anything else
+            if symbol.parent is not None:
+                parent_id = id(symbol.parent)
+                if parent_id not in duplicates_by_parent:
+                    duplicates_by_parent[parent_id] = self._find_duplicate_children(
+                        symbol.parent
+                    )
+                if id(symbol) in duplicates_by_parent[parent_id]:
+                    return
+
+            indent = "  " * indent_level
+            lines.append(f"{indent}{_format_symbol(symbol)}")
 
             # Sort children by kind, then line number
             sorted_children = sorted(
-                symbol.children, key=lambda s: (self._get_symbol_category(s), s.line)
+                ((self._get_symbol_category(s), s) for s in symbol.children),
+                key=lambda cs: (cs[0], cs[1].line),
             )
 
             # Group children by kind, filtering duplicates
             children_by_kind = {}
             seen_symbols = set()
-            for child in sorted_children:
+            for kind, child in sorted_children:
                 symbol_id = (child.name, child.kind, child.signature)
                 if symbol_id in seen_symbols:
                     continue
                 seen_symbols.add(symbol_id)
-                kind = self._get_symbol_category(child)
                 if kind not in children_by_kind:
                     children_by_kind[kind] = []
                 children_by_kind[kind].append(child)
 
             for kind in sorted(children_by_kind.keys()):
                 if children_by_kind[kind]:  # Only print categories with children
-                    print(f"{indent}  {kind}:", file=output)
+                    lines.append(f"{indent}  {kind}:")
                     for child in sorted(children_by_kind[kind], key=lambda s: s.line):
-                        write_symbol_tree(child, indent_level + 2)
-
-        for file_path in sorted(files_dict.keys()):
-            # Skip the output file itself if it's a regular file
-            if hasattr(output, "name") and file_path != Path(output.name).resolve():
-                try:
-                    rel_path = file_path.relative_to(self.ignore_manager.start_path)
-                    display_path = rel_path
-                except ValueError:
-                    display_path = file_path
-                print(f"\n{display_path}:", file=output)
-                print(self._get_file_info(file_path), file=output)
-
-            # Special handling for Markdown files
-            if file_path.suffix == ".md":
-                md_handler = MarkdownHandler()
-                headers = md_handler.extract_headers(file_path)
-                for line_num, level, header_text in headers:
-                    indent = "  " * level
-                    print(f"{indent}({line_num}) {header_text}", file=output)
-                continue
+                        write_symbol_tree(child, lines, indent_level + 2)
+
+        lines: List[str] = []
+
+        # Skip the output file itself if it's a regular file
+        if output_path is not None and file_path != output_path:
+            try:
+                rel_path = file_path.relative_to(self.ignore_manager.start_path)
+                display_path = rel_path
+            except ValueError:
+                display_path = file_path
+            lines.append(f"\n{display_path}:")
+            lines.append(self._get_file_info(file_path))
+
+        # Special handling for Markdown files
+        if file_path.suffix == ".md":
+            md_handler = self.handlers["Markdown"]
+            headers = md_handler.extract_headers(file_path)
+            for line_num, level, header_text in headers:
+                indent = "  " * level
+                lines.append(f"{indent}({line_num}) {header_text}")
+            return "\n".join(lines) + "\n" if lines else ""
+
+        # Check if a language-specific handler processes this file
+        handler = self.file_handlers.get(os.fspath(file_path)) or self._find_handler(
+            file_path
+        )
 
-            # Check if any language-specific handler wants to process this file
-            handler = None
-            for lang_handler in self.handlers.values():
-                if (
-                    lang_handler.should_process_file(file_path)
-                    == ProcessDecision.PROCESS
-                ):
-                    handler = lang_handler
-                    break
+        if handler and handler is not self.generic_handler:
+            # Use old structure for language-specific handlers
+            for module_path in sorted(modules.keys()):
+                if module_path:
+                    lines.append(f"  Module {module_path}:")
+                    indent = "    "
+                else:
+                    indent = "  "
+
+                categories = modules[module_path]
+                for category in sorted(categories.keys()):
+                    symbols = sorted(categories[category], key=lambda s: s.line)
+                    if symbols:
+                        lines.append(f"{indent}{category}:")
+                        for symbol in symbols:
+                            desc = symbol.pattern.strip()
+                            if symbol.signature:
+                                desc = symbol.signature
+                            lines.append(
+                                f"{indent}  ({symbol.line}) {symbol.name}: {desc}"
+                            )
+        # Use symbol tree for files handled by generic handler
+        elif file_path in self.file_trees:
+            tree = self.file_trees[file_path]
+            # Sort root symbols by category then line number
+            root_symbols = sorted(
+                ((self._get_symbol_category(s), s) for s in tree.root_symbols.values()),
+                key=lambda cs: (cs[0], cs[1].line),
+            )
 
-            if handler:
-                # Use old structure for language-specific handlers
-                for module_path in sorted(files_dict[file_path].keys()):
-                    if module_path:
-                        print(f"  Module {module_path}:", file=output)
-                        indent = "    "
-                    else:
-                        indent = "  "
-
-                    categories = files_dict[file_path][module_path]
-                    for category in sorted(categories.keys()):
-                        symbols = sorted(categories[category], key=lambda s: s.line)
-                        if symbols:
-                            print(f"{indent}{category}:", file=output)
-                            for symbol in symbols:
-                                desc = symbol.pattern.strip()
-                                if symbol.signature:
-                                    desc = symbol.signature
-                                print(
-                                    f"{indent}  ({symbol.line}) {symbol.name}: {desc}",
-                                    file=output,
-                                )
-            # Use symbol tree for files handled by generic handler
-            elif file_path in self.file_trees:
-                tree = self.file_trees[file_path]
-                # Sort root symbols by category then line number
-                root_symbols = sorted(
-                    tree.root_symbols.values(),
-                    key=lambda s: (self._get_symbol_category(s), s.line),
-                )
+            by_category = {}
+            for category, symbol in root_symbols:
+                if category not in by_category:
+                    by_category[category] = []
+                by_category[category].append(symbol)
 
-                by_category = {}
-                for symbol in root_symbols:
-                    category = self._get_symbol_category(symbol)
-                    if category not in by_category:
-                        by_category[category] = []
-                    by_category[category].append(symbol)
+            for category in sorted(by_category.keys()):
+                if category in {"Unknown", "File"} and not self.debug:
+                    continue
+                lines.append(f"  {category}:")
+                for symbol in by_category[category]:
+                    write_symbol_tree(symbol, lines, indent_level=2)
 
-                for category in sorted(by_category.keys()):
-                    if category in {"Unknown", "File"} and not self.debug:
-                        continue
-                    print(f"  {category}:", file=output)
-                    for symbol in by_category[category]:
-                        write_symbol_tree(symbol, indent_level=2)
+        return "\n".join(lines) + "\n" if lines else ""
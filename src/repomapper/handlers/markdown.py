@@ -2,13 +2,25 @@
 
 import re
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 from .base import CtagEntry, LanguageHandler, ProcessDecision
 
+# Headers of level 1-3, allowing for leading and trailing whitespace
+_HEADER_RE = re.compile(
+    rb"^[ \t]*(#{1,3})[ \t]+([^ \t\r\n](?:.*[^ \t\r\n])?)[ \t\r]*$", re.MULTILINE
+)
+
 
 class MarkdownHandler(LanguageHandler):
     """Handler for Markdown files with direct header parsing."""
 
+    def __init__(self):
+        """Initialize Markdown handler."""
+        # Headers by file, with the (mtime, size) they were extracted at
+        self._headers_cache: Dict[
+            Path, Tuple[Tuple[int, int], List[Tuple[int, int, str]]]
+        ] = {}
+
     def should_process_file(self, file_path: Path) -> ProcessDecision:
         return (
             ProcessDecision.PROCESS
@@ -23,17 +35,24 @@ class MarkdownHandler(LanguageHandler):
     def extract_headers(self, file_path: Path) -> List[Tuple[int, int, str]]:
         """Extract headers from Markdown file.
         Returns list of (line_number, level, header_text) tuples,
-        sorted by line number.
+        sorted by line number. Results are reused while the file is unchanged.
         """
+        stat = file_path.stat()
+        version = (stat.st_mtime_ns, stat.st_size)
+        cached = self._headers_cache.get(file_path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        # Scan the whole file at once, counting lines only between matches
+        data = file_path.read_bytes()
         headers = []
-        with file_path.open() as f:
-            for i, line in enumerate(f, 1):
-                line = line.strip()
-                if line.startswith("#"):
-                    # Match headers of level 1-3, allowing for leading whitespace
-                    match = re.match(r"^(#{1,3})\s+(.+)$", line)
-                    if match:
-                        level = len(match.group(1))
-                        if level <= 3:
-                            headers.append((i, level, match.group(2)))
-        return sorted(headers)  # Sort by line number
+        line_num = 1
+        pos = 0
+        for match in _HEADER_RE.finditer(data):
+            line_num += data.count(b"\n", pos, match.start())
+            pos = match.start()
+            header_text = match.group(2).decode("utf-8", "replace")
+            headers.append((line_num, len(match.group(1)), header_text))
+
+        self._headers_cache[file_path] = (version, headers)
+        return headers
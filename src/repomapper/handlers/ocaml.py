@@ -1,9 +1,91 @@
 """OCamlHandler class"""
 
+import functools
 from pathlib import Path
-from typing import List, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 from .base import CtagEntry, LanguageHandler, ProcessDecision
 
+# Deletes every operator character, so operator names translate to ""
+_OPERATOR_DELETE = str.maketrans("", "", "!@#$%^&*+-=<>/?|~")
+
+
+def _prefixed_scope(scope: str) -> List[str]:
+    # Explicit module: prefix
+    return scope[7:].split(".")
+
+
+def _module_scope(scope: str) -> List[str]:
+    # Module scopes without prefix, dots separate nested modules
+    return scope.split(".")
+
+
+def _type_scope(scope: str) -> List[str]:
+    # Type-scoped items use / as separator, exclude the type name and split
+    # any module.type parts
+    return [name for part in scope.split("/")[:-1] for name in part.split(".")]
+
+
+def _dotted_scope(scope: str) -> List[str]:
+    # Other formats: take all but the last part as module path
+    return scope.split(".")[:-1]
+
+
+_SCOPE_PARSERS: Dict[str, Callable[[str], List[str]]] = {
+    "prefix": _prefixed_scope,
+    "kind": _module_scope,
+    "slash": _type_scope,
+    "dot": _dotted_scope,
+}
+
+
+@functools.lru_cache(maxsize=4096)
+def _scope_path(scope: str, scope_kind: str) -> Tuple[str, ...]:
+    """Module path of a ctags scope, shared by the symbols of that scope."""
+    if not scope:
+        return ()
+    tag = (
+        "prefix"
+        if scope[:7] == "module:"
+        else "kind"
+        if scope_kind == "module"
+        else "slash"
+        if "/" in scope
+        else "dot"
+    )
+    return tuple(_SCOPE_PARSERS[tag](scope))
+
+
+def _module_path(entry: CtagEntry) -> Tuple[str, ...]:
+    """Module path of a symbol from its ctags scope fields."""
+    path = _scope_path(entry.get("scope", ""), entry.get("scopeKind", ""))
+    # If this is a module definition itself, add it to the path
+    if entry.get("kind") == "module":
+        return (*path, entry.get("name", ""))
+    return path
+
+
+def _clean_pattern(entry: CtagEntry) -> Optional[str]:
+    """Get an entry's pattern without /^ and $/, or None if it isn't a string."""
+    pattern = entry.get("pattern", "")
+    return pattern.strip("/^$/") if isinstance(pattern, str) else None
+
+
+def _categorize(kind: str, name: str) -> Optional[str]:
+    """Map an OCaml symbol's kind and name to its section."""
+    if kind in {"function", "val"}:
+        # Separate operators from regular functions
+        if not name.rpartition(".")[2].translate(_OPERATOR_DELETE):
+            return "Operators"
+        return "Functions"
+    elif kind == "type":
+        return "Types"
+    elif kind == "exception":
+        return "Exceptions"
+    elif kind == "module":
+        # All module declarations (including aliases) are modules
+        return "Modules"
+    return None
+
 
 class OCamlHandler(LanguageHandler):
     """Handler for OCaml files."""
@@ -23,77 +105,18 @@ class OCamlHandler(LanguageHandler):
 
     def _get_module_path(self, entry: CtagEntry) -> List[str]:
         """Get the module path as a list of module names."""
-        path = []
-        scope = entry.get("scope", "")
-        scope_kind = entry.get("scopeKind", "")
-
-        # Handle different scope formats
-        if scope:
-            if scope.startswith("module:"):
-                # Handle explicit module: prefix
-                path = scope[7:].split(".")
-            elif scope_kind == "module":
-                # Handle module scopes without prefix
-                path = scope.split(".")  # Split on dots for nested modules
-            elif "/" in scope:
-                # Handle type-scoped items (they use / as separator)
-                module_parts = scope.split("/")[0:-1]  # Exclude the type name
-                for part in module_parts:
-                    if "." in part:  # Handle module.type format
-                        path.extend(part.split("."))
-                    else:
-                        path.append(part)
-            else:
-                # Try to handle other scope formats
-                parts = scope.split(".")
-                if len(parts) > 1:
-                    path = parts[:-1]  # Take all but the last part as module path
-
-        # If this is a module definition itself, add it to the path
-        if entry.get("kind") == "module":
-            path.append(entry.get("name", ""))
-
-        return path
-
-    def _get_full_name(self, entry: CtagEntry) -> str:
-        """Get the fully qualified name including module path."""
-        name = entry.get("name", "")
-        path = self._get_module_path(entry)
-
-        if path:
-            return f"{'.'.join(path)}.{name}"
-        return name
+        return list(_module_path(entry))
 
     def categorize_symbol(self, entry: CtagEntry) -> Optional[str]:
-        kind = entry.get("kind", "")
-        name = self._get_full_name(entry)
-
-        if kind in {"function", "val"}:
-            # Separate operators from regular functions
-            if all(c in "!@#$%^&*+-=<>/?|~" for c in name.split(".")[-1]):
-                return "Operators"
-            return "Functions"
-        elif kind == "type":
-            return "Types"
-        elif kind == "exception":
-            return "Exceptions"
-        elif kind == "module":
-            # All module declarations (including aliases) are modules
-            return "Modules"
-        return None
+        return _categorize(entry.get("kind", ""), entry.get("name", ""))
 
     def filter_symbol(self, entry: CtagEntry) -> bool:
         # Get pattern safely, some entries might not have it
-        pattern = entry.get("pattern", "")
-        if not isinstance(pattern, str):
+        pattern = _clean_pattern(entry)
+        if pattern is None:
             return True
-        pattern = pattern.strip("/^$/")
-        # Skip OCaml implementation details and docstrings
-        return not (
-            pattern.startswith("(**")
-            or pattern.endswith("{")
-            or pattern.endswith("= {")
-        )
+        # Skip OCaml implementation details (ending with { or = {) and docstrings
+        return not (pattern.startswith("(**") or pattern.endswith("{"))
 
     def get_symbol_description(self, entry: CtagEntry) -> str:
         """Get formatted description, preferring signature over pattern."""
@@ -101,15 +124,14 @@ class OCamlHandler(LanguageHandler):
         if signature:
             # Remove 'let' from the start of signatures
             return signature.replace("let ", "")
-        pattern = entry.get("pattern", "")
-        if isinstance(pattern, str):
-            return pattern.strip("/^$/")
-        return str(pattern)
+        pattern = _clean_pattern(entry)
+        if pattern is not None:
+            return pattern
+        return str(entry.get("pattern"))
 
     def get_module_path(self, entry: CtagEntry) -> str:
         """Get the module path as a dot-separated string."""
-        path = self._get_module_path(entry)
-        return ".".join(path) if path else ""
+        return ".".join(_module_path(entry))
 
     def get_symbol_name(self, entry: CtagEntry) -> str:
         """Get the symbol name."""
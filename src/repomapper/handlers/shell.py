@@ -16,13 +16,13 @@ class ShellHandler(LanguageHandler):
         return ProcessDecision.UNHANDLED
 
     def categorize_symbol(self, entry: CtagEntry) -> Optional[str]:
-        kind = entry.get("kind", "")
-        pattern = entry.get("pattern", "")
+        if entry.get("kind") != "function":
+            return None
 
-        if kind == "function":
-            # Only show actual function definitions, not variable assignments
-            if isinstance(pattern, str) and (
-                "function " in pattern or pattern.endswith("() {")
-            ):
-                return "Functions"
+        # Only show actual function definitions, not variable assignments
+        pattern = entry.get("pattern", "")
+        if isinstance(pattern, str) and (
+            "function " in pattern or pattern.endswith("() {")
+        ):
+            return "Functions"
         return None
@@ -1,11 +1,204 @@
 """IgnorePatternManager class"""
 
+import functools
+import itertools
 import os
 import re
-from collections import defaultdict
 from pathlib import Path
-from typing import Dict, List, Optional
-from .types import CompiledPattern
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+from .types import CompiledPattern, PatternRun, RegexMatcher
+
+try:
+    from re2 import compile as regex_compile
+except ImportError:  # google-re2 is optional, fall back to the standard library
+    from re import compile as regex_compile
+
+# Ignore files read in each directory, by pattern source type
+_IGNORE_FILE_TYPES = (("git", ".gitignore"), ("map", ".mapignore"))
+_IGNORE_FILE_NAMES = frozenset(filename for _, filename in _IGNORE_FILE_TYPES)
+
+# Patterns without any of these match a single path component literally
+_NON_LITERAL_CHARS = frozenset("*?[\\/")
+
+
+@functools.lru_cache(maxsize=None)
+def _find_git_root(start: str) -> Optional[str]:
+    """Find the closest directory containing .git from start, see find_git_root()."""
+    current = start
+    while True:
+        if os.path.lexists(os.path.join(current, ".git")):
+            return current
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None
+        current = parent
+
+
+def _translate_glob(glob: str) -> str:
+    """Translate a gitignore glob into a regex, see _compile_pattern().
+
+    As in git, * and ? never match a /, ** matches any number of directories
+    when it is a whole path component, [...] is a character class and a
+    backslash makes the next character literal.
+    """
+    regex = []
+    i, n = 0, len(glob)
+    while i < n:
+        c = glob[i]
+        i += 1
+        if c == "*":
+            start = i - 1
+            while i < n and glob[i] == "*":
+                i += 1
+            component = (start == 0 or glob[start - 1] == "/") and (
+                i == n or glob[i] == "/"
+            )
+            if component and i - start > 1:
+                if i == n:
+                    # Trailing /** matches everything inside, a lone ** anything
+                    regex.append(".+" if start else ".*")
+                else:
+                    # **/ matches zero or more directories
+                    regex.append("(?:.*/)?")
+                    i += 1
+            else:
+                # Names are never empty (directories end with / when matched)
+                regex.append("[^/]+" if component else "[^/]*")
+        elif c == "?":
+            regex.append("[^/]")
+        elif c == "[":
+            end = i
+            if end < n and glob[end] in "!^":
+                end += 1
+            if end < n and glob[end] == "]":  # A leading ] is a member
+                end += 1
+            while end < n and glob[end] != "]":
+                end += 2 if glob[end] == "\\" else 1
+            if end >= n:  # Unterminated, so a literal [
+                regex.append(re.escape(c))
+                continue
+            members = glob[i:end]
+            i = end + 1
+            negate = members[:1] in ("!", "^")
+            if negate:
+                members = members[1:]
+            chars = []
+            j = 0
+            while j < len(members):
+                m = members[j]
+                if m == "\\" and j + 1 < len(members):
+                    j += 1
+                    chars.append(re.escape(members[j]))
+                elif m == "-" and chars and j + 1 < len(members):
+                    chars.append("-")  # Range
+                else:
+                    chars.append(re.escape(m))
+                j += 1
+            regex.append(("[^/" if negate else "[") + "".join(chars) + "]")
+        elif c == "\\" and i < n:
+            regex.append(re.escape(glob[i]))
+            i += 1
+        else:
+            regex.append(re.escape(c))
+    return "".join(regex)
+
+
+def _compile_run(regex: str) -> RegexMatcher:
+    """Compile a combined regex, with re2 if available.
+
+    re2 matches in linear time, without backtracking through alternatives.
+    """
+    try:
+        return regex_compile(regex)
+    except Exception:  # Syntax re2 does not support: re accepted it already
+        return re.compile(regex)
+
+
+def _is_literal(pattern: CompiledPattern) -> bool:
+    """Check if a pattern only matches path components equal to it."""
+    return bool(pattern.pattern) and _NON_LITERAL_CHARS.isdisjoint(pattern.pattern)
+
+
+def _combine_runs(patterns: Iterable[CompiledPattern]) -> List[PatternRun]:
+    """Combine one directory's compiled patterns into one regex per run.
+
+    A run is a sequence of consecutive patterns, either all negations or none.
+    Runs are listed last first, so that the first run matching a path
+    contains the last pattern matching it, which decides.
+
+    Within a run, order does not matter, so literal names (like node_modules)
+    are kept in sets looked up per path component, and only actual globs go
+    into the run's regex.
+    """
+    runs = []
+    for is_negation, run in itertools.groupby(patterns, key=lambda p: p.is_negation):
+        names, dir_names, globs = set(), set(), []
+        for pattern in run:
+            if not _is_literal(pattern):
+                globs.append(f"(?:{pattern.regex.pattern})")
+            elif pattern.is_dir_only:
+                dir_names.add(pattern.pattern)
+            else:
+                names.add(pattern.pattern)
+        runs.append(
+            PatternRun(
+                is_negation,
+                frozenset(names),
+                frozenset(dir_names),
+                _compile_run("|".join(globs)) if globs else None,
+            )
+        )
+    runs.reverse()
+    return runs
+
+
+def _ancestor_runs(
+    runs_by_dir: Dict[str, List[PatternRun]], prefix: str
+) -> List[Tuple[int, List[PatternRun]]]:
+    """Find the pattern runs which apply to paths starting with prefix.
+
+    Only directories that are ancestors of a path have patterns that apply.
+    As in git, patterns of deeper directories take precedence, so they are
+    listed from the deepest directory up.
+
+    Args:
+        runs_by_dir: Pattern runs by directory, see _combine_runs()
+        prefix: Parent directory of the paths with a trailing /, or ""
+
+    Returns:
+        Runs of each directory, with the offset of paths relative to it
+    """
+    ancestors = []
+    end = 0
+    while end != -1:
+        if runs := runs_by_dir.get(prefix[:end]):
+            ancestors.append((end + 1 if end else 0, runs))
+        end = prefix.find("/", end + 1)
+    ancestors.reverse()
+    return ancestors
+
+
+def _match_runs(ancestors: List[Tuple[int, List[PatternRun]]], path_str: str) -> bool:
+    """Match a path against the runs of its ancestors, see _ancestor_runs().
+
+    Only the path itself is matched: paths inside an ignored directory are
+    left to the caller, see IgnorePatternManager.should_ignore().
+    """
+    is_dir = path_str.endswith("/")
+    name = path_str.rstrip("/").rpartition("/")[2]
+    for offset, runs in ancestors:
+        # Part of the path relative to the pattern's directory, empty for
+        # the directory itself, which its own patterns do not apply to
+        if rel_path := path_str[offset:]:
+            for run in runs:
+                if (
+                    name in run.names
+                    or (is_dir and name in run.dir_names)
+                    or (run.regex is not None and run.regex.search(rel_path))
+                ):
+                    return not run.is_negation
+
+    return False
 
 
 class IgnorePatternManager:
@@ -18,11 +211,47 @@ class IgnorePatternManager:
     4. Determining if files should be ignored based on combined patterns
     """
 
-    def __init__(self, start_path: Path):
-        """Initialize with a starting path to locate git root from."""
+    def __init__(self, start_path: Path, scan_tree: bool = True):
+        """Initialize with a starting path to locate git root from.
+
+        Args:
+            start_path: Directory to locate git root from and collect patterns in
+            scan_tree: Whether to walk start_path for ignore files right away.
+                If False, only those of start_path and its ancestors are read,
+                and a caller walking start_path itself reports each directory
+                it lists with on_dir() before matching paths inside it.
+        """
         self.start_path = start_path.resolve()
         self.git_root = self.find_git_root()
-        self.patterns_by_dir = self.collect_ignore_patterns() if self.git_root else {}
+        self.scan_tree = scan_tree
+        # Verdicts shared by all files in a directory, see should_ignore_dir()
+        self._dir_cache: Dict[str, bool] = {}
+        # Runs applying in a directory ("" or ending with /), see _ancestor_runs()
+        self._ancestors_cache: Dict[str, List[Tuple[int, List[PatternRun]]]] = {}
+        self._match_path = functools.lru_cache(maxsize=8192)(self._match_patterns)
+        self.patterns_by_dir = self.collect_ignore_patterns()
+
+    def refresh(self) -> bool:
+        """Reload patterns and drop cached decisions if any ignore file changed.
+
+        Only the ignore files found when patterns were last collected are
+        checked; ignore files created since then are not detected.
+
+        Returns:
+            True if patterns were reloaded, False if nothing changed
+        """
+        for ignore_file, mtime in self._ignore_mtimes.items():
+            try:
+                if os.stat(ignore_file).st_mtime_ns == mtime:
+                    continue
+            except OSError:
+                pass
+            break
+        else:
+            return False
+
+        self.patterns_by_dir = self.collect_ignore_patterns()
+        return True
 
     def find_git_root(self) -> Optional[Path]:
         """Find the git root directory (containing .git/) by walking up from start_path.
@@ -33,23 +262,17 @@ class IgnorePatternManager:
         Note:
             The .git directory might be a file in case of git worktrees or submodules.
             We consider the parent of .git as the root in all cases.
+            Results are cached for the life of the process.
         """
-        current = self.start_path
-
-        while current != current.parent:
-            git_dir = current / ".git"
-            if git_dir.exists():
-                return current
-            current = current.parent
-
-        root_git = current / ".git"
-        return current if root_git.exists() else None
+        git_root = _find_git_root(os.fspath(self.start_path))
+        return Path(git_root) if git_root is not None else None
 
     def _parse_ignore_file(self, ignore_path: Path) -> List[str]:
         """Parse an ignore file (either .gitignore or .mapignore) into a list of patterns.
 
         Handles:
         - Empty lines and comments (ignored)
+        - Trailing spaces (ignored unless escaped with a backslash)
         - Basic glob patterns
         - Negation patterns (starting with !)
         - Directory-specific patterns (ending with /)
@@ -57,18 +280,23 @@ class IgnorePatternManager:
         Returns:
             List of valid ignore patterns found in the file
         """
-        if not ignore_path.is_file():
+        # Ignore files are tiny, read them whole rather than line by line and
+        # treat an unreadable one as empty instead of stat()ing it first
+        try:
+            data = ignore_path.read_text(errors="replace")
+        except OSError:
             return []
 
         patterns = []
-        with ignore_path.open() as f:
-            for line in f:
-                # Remove comments and whitespace
-                line = line.split("#")[0].strip()
-                if not line:
-                    continue
-
-                patterns.append(line)
+        for raw_line in data.splitlines():
+            # As in git, only lines starting with # are comments
+            line = raw_line.rstrip()
+            if not line or line[0] == "#":
+                continue
+            if line[-1] == "\\" and len(line) < len(raw_line):
+                line += " "  # Escaped trailing space
+
+            patterns.append(line)
         return patterns
 
     def collect_ignore_patterns(
@@ -78,7 +306,10 @@ class IgnorePatternManager:
 
         This method performs a complete collection of ignore patterns by:
         1. Walking up from start_from to git root to collect ancestor patterns
-        2. Walking down through all subdirectories to collect descendant patterns
+        2. Walking down through all subdirectories to collect descendant patterns,
+           unless scan_tree is False (see on_dir())
+
+        Patterns collected before are dropped.
 
         Args:
             start_from: Path to start collecting from (defaults to self.start_path)
@@ -93,42 +324,127 @@ class IgnorePatternManager:
               (closer to target) will override more general ones when applied.
             - Both .gitignore and .mapignore use the same pattern syntax.
             - Patterns from deeper directories are automatically scoped to their location
+            - As with git, ignore files inside ignored directories are not read
         """
+        self.patterns_by_dir = {}
+        # Modification times of the ignore files patterns were loaded from
+        self._ignore_mtimes: Dict[str, int] = {}
+        # Combined patterns by directory ("" for the git root), see _combine_runs()
+        self._runs_by_dir: Dict[str, List[PatternRun]] = {}
+        self._checked_dirs: Set[str] = set()
+        self._dir_cache.clear()
+        self._ancestors_cache.clear()
+        self._match_path.cache_clear()
         if self.git_root is None:
-            return {}
+            return self.patterns_by_dir
 
-        start_from = start_from or self.start_path
-        patterns_by_dir = defaultdict(lambda: {"git": [], "map": []})
-
-        def check_directory(path: Path) -> None:
-            """Check a directory for ignore files and add any patterns found."""
-            rel_path = path.relative_to(self.git_root)
-            # Use '.' for root directory instead of empty string
-            key = Path(".") if path == self.git_root else rel_path
-
-            for ignore_type, filename in [("git", ".gitignore"), ("map", ".mapignore")]:
-                ignore_file = path / filename
-                if ignore_file.is_file():
-                    patterns = self._parse_ignore_file(ignore_file)
-                    if patterns:
-                        patterns_by_dir[key][ignore_type] = patterns
+        start_from = (start_from or self.start_path).resolve()
+        # Directories are handled as strings, Path objects are only created
+        # for the keys of patterns_by_dir
+        git_root_str = os.fspath(self.git_root)
+        root_prefix = os.path.join(git_root_str, "")
 
         # First, walk up to collect ancestor patterns
-        current = start_from.resolve()
-        while current >= self.git_root:
-            check_directory(current)
-            if current == self.git_root:
+        start_str = os.fspath(start_from)
+        current = start_str
+        while current == git_root_str or current.startswith(root_prefix):
+            self.check_directory(current)
+            if current == git_root_str:
                 break
-            current = current.parent
+            current = os.path.dirname(current)
+        if not self.scan_tree:
+            return self.patterns_by_dir
+
+        # Then, walk down to collect descendant patterns. Each directory is
+        # scanned once, which tells both its ignore files and its subdirectories.
+        rel_start = "" if start_str == git_root_str else start_str[len(root_prefix) :]
+        pending = [(start_str, rel_start + "/" if rel_start else "")]
+        while pending:
+            dir_path, prefix = pending.pop()
+            found = set()
+            subdirs = []
+            try:
+                with os.scandir(dir_path) as it:
+                    for entry in it:
+                        if entry.name in _IGNORE_FILE_NAMES:
+                            if entry.is_file():
+                                found.add(entry.name)
+                        # Hidden directories (.git included) are never mapped,
+                        # so their ignore files are irrelevant
+                        elif not entry.name.startswith(".") and entry.is_dir(
+                            follow_symlinks=False
+                        ):
+                            subdirs.append(entry.name)
+            except OSError:
+                continue
+            self.check_directory(dir_path, found)
+
+            # Prune ignored directories too, as should_ignore_dir() would
+            ancestors = _ancestor_runs(self._runs_by_dir, prefix)
+            for name in subdirs:
+                rel_dir = prefix + name
+                if not _match_runs(ancestors, rel_dir + "/"):
+                    pending.append((os.path.join(dir_path, name), rel_dir + "/"))
+
+        return self.patterns_by_dir
+
+    def check_directory(self, dir_path: str, found: Optional[Set[str]] = None) -> None:
+        """Check a directory for ignore files and add any patterns found.
 
-        # Then, walk down to collect descendant patterns
-        for root, dirs, _ in os.walk(start_from):
-            root_path = Path(root)
-            if ".git" in dirs:
-                dirs.remove(".git")
-            check_directory(root_path)
-
-        return dict(patterns_by_dir)
+        Args:
+            dir_path: Absolute path of a directory under git root
+            found: Names of the ignore files present, if already known
+        """
+        self._checked_dirs.add(dir_path)
+        git_root_str = os.fspath(self.git_root)
+        # Use '.' for root directory instead of empty string
+        if dir_path == git_root_str:
+            key_str = ""
+        else:
+            key_str = dir_path[len(os.path.join(git_root_str, "")) :]
+        key = Path(key_str or ".")
+
+        dir_patterns: Dict[str, List[str]] = {"git": [], "map": []}
+        for ignore_type, filename in _IGNORE_FILE_TYPES:
+            ignore_file = os.path.join(dir_path, filename)
+            if filename in found if found is not None else os.path.isfile(ignore_file):
+                # It may have been removed since it was found, as in --watch
+                try:
+                    mtime = os.stat(ignore_file).st_mtime_ns
+                except OSError:
+                    continue
+                self._ignore_mtimes[ignore_file] = mtime
+                dir_patterns[ignore_type] = self._parse_ignore_file(Path(ignore_file))
+
+        if dir_patterns["git"] or dir_patterns["map"]:
+            self.patterns_by_dir[key] = dir_patterns
+            self._runs_by_dir[key_str] = _combine_runs(
+                self._compile_dir_patterns(key, dir_patterns)
+            )
+            # Decisions made so far may not have seen these patterns
+            self._dir_cache.clear()
+            self._ancestors_cache.clear()
+            self._match_path.cache_clear()
+
+    def on_dir(self, dir_path: str, entries: Iterable[os.DirEntry]) -> None:
+        """Add the patterns of a directory listed by the caller's own walk.
+
+        With scan_tree False, this replaces the walk of collect_ignore_patterns():
+        call it for each directory below start_path, with the entries listed
+        by os.scandir(), before matching paths inside it. Ignore files are
+        found among those entries, so no directory is probed for them.
+        Directories already checked are skipped.
+        """
+        if dir_path in self._checked_dirs:
+            return
+        self.check_directory(
+            dir_path,
+            {
+                entry.name
+                for entry in entries
+                if entry.name in _IGNORE_FILE_NAMES and entry.is_file()
+            },
+        )
 
     def _compile_pattern(
         self, pattern: str, source_dir: Path, source_type: str
@@ -151,26 +467,16 @@ class IgnorePatternManager:
         if is_dir_only:
             pattern = pattern[:-1]
 
-        # Convert glob pattern to regex
-        # 1. Escape special regex chars except * and ?
-        regex = re.escape(pattern)
-        # 2. Convert glob patterns to regex patterns
-        # Handle glob patterns (order matters: ** must be handled before *)
-        regex = regex.replace(r"\*\*", ".*")
-        regex = regex.replace(r"\*", "[^/]*")
-        regex = regex.replace(r"\?", "[^/]")
-        # 3. Handle directory-specific patterns
-        if is_dir_only:
-            regex += "/.*"
-        # 4. Anchor pattern appropriately
-        if pattern.startswith("/"):
-            regex = "^" + regex[1:] + "$"
-        elif "/" in pattern:
-            # Can match anywhere under source_dir
-            regex = ".*/" + regex + "$"
+        # A / other than a trailing one anchors the pattern to source_dir,
+        # otherwise it matches at any level below it. Paths are matched
+        # with search(), relative to source_dir.
+        if "/" in pattern:
+            glob = pattern[1:] if pattern.startswith("/") else pattern
+            regex = "^" + _translate_glob(glob)
         else:
-            # Pattern without / can match any component
-            regex = "(^|.*/?)" + regex + "($|/.*)"
+            regex = "(?:^|/)" + _translate_glob(pattern)
+        # Only the path itself matches, directories ending with /
+        regex += "/$" if is_dir_only else "/?$"
 
         return CompiledPattern(
             pattern=pattern,
@@ -178,59 +484,63 @@ class IgnorePatternManager:
             is_negation=is_negation,
             is_dir_only=is_dir_only,
             source_dir=source_dir,
+            source_dir_str="" if source_dir == Path(".") else str(source_dir),
             source_type=source_type,
         )
 
-    def _compile_all_patterns(self) -> List[CompiledPattern]:
-        """Compile all patterns from all ignore files.
+    def _compile_dir_patterns(
+        self, dir_path: Path, dir_patterns: Dict[str, List[str]]
+    ) -> List[CompiledPattern]:
+        """Compile the patterns of one directory, in order of precedence."""
+        return [
+            self._compile_pattern(pattern, dir_path, source_type)
+            for source_type in ["git", "map"]
+            for pattern in dir_patterns[source_type]
+        ]
 
-        Returns patterns in order of precedence (more specific paths first).
-        """
-        all_patterns: List[CompiledPattern] = []
+    def should_ignore_dir(self, path: Union[str, Path]) -> bool:
+        """Determine if a whole directory can be skipped.
 
-        # Get all directories with patterns, sorted by path depth (deepest first)
-        dirs = sorted(
-            self.patterns_by_dir.keys(), key=lambda p: len(p.parts), reverse=True
-        )
+        Args:
+            path: Directory to check, must be relative to git root
 
-        for dir_path in dirs:
-            dir_patterns = self.patterns_by_dir[dir_path]
-            for source_type in ["git", "map"]:
-                for pattern in dir_patterns[source_type]:
-                    compiled = self._compile_pattern(pattern, dir_path, source_type)
-                    all_patterns.append(compiled)
+        Returns:
+            True if the directory itself is ignored, False otherwise. As in
+            git, no negation pattern can re-include a path inside an ignored
+            directory.
+        """
+        dir_str = str(path).rstrip("/")
+        if (cached := self._dir_cache.get(dir_str)) is not None:
+            return cached
 
-        return all_patterns
+        result = self.should_ignore(dir_str + "/")
+        self._dir_cache[dir_str] = result
+        return result
 
-    def should_ignore(self, path: Path) -> bool:
+    def should_ignore(self, path: Union[str, Path]) -> bool:
         """Determine if a path should be ignored based on all patterns.
 
         Args:
-            path: Path to check, must be relative to git root
+            path: Path to check, must be relative to git root (directories
+                may be given with a trailing /)
 
         Returns:
-            True if path matches any non-negated pattern and no later
-            negation pattern, False otherwise.
+            True if a parent directory is ignored, or if the last pattern
+            matching path in the deepest ignore file with one is not a
+            negation, False otherwise.
         """
-        if not hasattr(self, "_compiled_patterns"):
-            self._compiled_patterns = self._compile_all_patterns()
-
         path_str = str(path)
-        is_ignored = False
-
-        # Check each pattern in order (most specific first)
-        for pattern in self._compiled_patterns:
-            # Get the part of the path relative to the pattern's directory
-            if pattern.source_dir == Path("."):
-                rel_path = path_str
-            else:
-                # Only check patterns from directories that are ancestors of this path
-                pattern_dir_str = str(pattern.source_dir)
-                if not path_str.startswith(pattern_dir_str + "/"):
-                    continue
-                rel_path = path_str[len(pattern_dir_str) :]
-
-            if pattern.regex.search(rel_path):
-                is_ignored = not pattern.is_negation
-
-        return is_ignored
+        # Everything inside an ignored directory is ignored
+        parent = path_str.rstrip("/").rpartition("/")[0]
+        if parent and self.should_ignore_dir(parent):
+            return True
+        return self._match_path(path_str)
+
+    def _match_patterns(self, path_str: str) -> bool:
+        """Match a path against all patterns, see should_ignore()."""
+        # Paths in the same directory share their ancestors' runs
+        prefix = path_str[: path_str.rfind("/") + 1]
+        if (ancestors := self._ancestors_cache.get(prefix)) is None:
+            ancestors = _ancestor_runs(self._runs_by_dir, prefix)
+            self._ancestors_cache[prefix] = ancestors
+        return _match_runs(ancestors, path_str)
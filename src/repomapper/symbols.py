@@ -1,10 +1,11 @@
 """Symbol and SymbolTree classes for code mapping."""
 
-from dataclasses import dataclass
-from typing import Dict, List, Optional
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+from .types import _SLOTS
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class Symbol:
     """Represents a code symbol with its metadata."""
 
@@ -18,55 +19,94 @@ class Symbol:
 
     # Relationship tracking
     parent: Optional["Symbol"] = None
-    children: List["Symbol"] = None
-    inherits_from: List[str] = None
-
-    def __post_init__(self):
-        """Initialize collections after basic initialization."""
-        if self.children is None:
-            self.children = []
-        if self.inherits_from is None:
-            self.inherits_from = []
+    children: List["Symbol"] = field(default_factory=list)
+    inherits_from: List[str] = field(default_factory=list)
+
+    # (base name, kind, pattern) and (base name, kind, signature) of children
+    # added with add_child(), to find duplicates without scanning children
+    _child_patterns: Set[Tuple[str, str, str]] = field(
+        default_factory=set, init=False, repr=False, compare=False
+    )
+    _child_signatures: Set[Tuple[str, str, Optional[str]]] = field(
+        default_factory=set, init=False, repr=False, compare=False
+    )
 
     def add_child(self, child: "Symbol") -> None:
-        """Add a child symbol and set its parent."""
-        child_base = child.name.split(".")[-1]
-
-        for existing in self.children:
-            existing_base = existing.name.split(".")[-1]
-            if (
-                existing_base == child_base
-                and existing.kind == child.kind
-                and (
-                    existing.pattern == child.pattern
-                    or existing.signature == child.signature
-                )
-            ):
-                return
-
+        """Add a child symbol and set its parent.
+
+        A child with the same base name and kind as an existing one, and the
+        same pattern or signature, is a duplicate and is not added.
+        """
+        child_base = child.name.rsplit(".", 1)[-1]
+        pattern_key = (child_base, child.kind, child.pattern)
+        signature_key = (child_base, child.kind, child.signature)
+        if pattern_key in self._child_patterns:
+            return
+        if signature_key in self._child_signatures:
+            return
+
+        self._child_patterns.add(pattern_key)
+        self._child_signatures.add(signature_key)
         self.children.append(child)
         child.parent = self
 
 
+class _ScopeNode:
+    """A node of the scope trie of SymbolTree, one per name component."""
+
+    __slots__ = ("symbol", "children")
+
+    def __init__(self):
+        self.symbol: Optional[Symbol] = None
+        self.children: Dict[str, "_ScopeNode"] = {}
+
+
 class SymbolTree:
     """Manages hierarchical relationships between symbols."""
 
+    __slots__ = ("root_symbols", "_scopes")
+
     def __init__(self):
         self.root_symbols: Dict[str, Symbol] = {}  # Keyed by fully qualified name
-        self.scope_map: Dict[str, Symbol] = {}
+        # Scope symbols by dotted name, split into a trie of name components
+        # so that scope prefixes are found without joining strings
+        self._scopes = _ScopeNode()
+
+    @property
+    def scope_map(self) -> Dict[str, Symbol]:
+        """Scope symbols by dotted name (built on each access)."""
+        scope_map = {}
+        pending = [((), self._scopes)]
+        while pending:
+            parts, node = pending.pop()
+            if node.symbol is not None:
+                scope_map[".".join(parts)] = node.symbol
+            for part, child in node.children.items():
+                pending.append(((*parts, part), child))
+        return scope_map
+
+    def _scope_node(self, name: str) -> _ScopeNode:
+        """Get the trie node of a dotted name, creating it if needed."""
+        node = self._scopes
+        for part in name.split("."):
+            child = node.children.get(part)
+            if child is None:
+                child = node.children[part] = _ScopeNode()
+            node = child
+        return node
 
     def add_symbol(self, symbol: Symbol, scope: Optional[str] = None) -> None:
         """Add a symbol to the tree, maintaining proper relationships."""
         if scope:
-            scope_parts = scope.split(".")
-            current_scope = ""
+            # The parent is the symbol of the longest known prefix of scope
             current_parent = None
-
-            for part in scope_parts:
-                current_scope = f"{current_scope}.{part}" if current_scope else part
-                parent = self.scope_map.get(current_scope)
-                if parent:
-                    current_parent = parent
+            node = self._scopes
+            for part in scope.split("."):
+                node = node.children.get(part)
+                if node is None:
+                    break
+                if node.symbol is not None:
+                    current_parent = node.symbol
 
             if current_parent:
                 current_parent.add_child(symbol)
@@ -75,13 +115,20 @@ class SymbolTree:
         else:
             self.root_symbols[symbol.name] = symbol
 
-        full_name = f"{scope}.{symbol.name}" if scope else symbol.name
-
         if symbol.kind in {"class", "struct", "interface", "namespace", "module", "c"}:
-            self.scope_map[full_name] = symbol
-            if symbol.name not in self.scope_map:
-                self.scope_map[symbol.name] = symbol
+            full_name = f"{scope}.{symbol.name}" if scope else symbol.name
+            self._scope_node(full_name).symbol = symbol
+            alias = self._scope_node(symbol.name)
+            if alias.symbol is None:
+                alias.symbol = symbol
 
     def get_symbol(self, name: str) -> Optional[Symbol]:
         """Get a symbol by its fully qualified name."""
-        return self.root_symbols.get(name) or self.scope_map.get(name)
+        if symbol := self.root_symbols.get(name):
+            return symbol
+        node = self._scopes
+        for part in name.split("."):
+            node = node.children.get(part)
+            if node is None:
+                return None
+        return node.symbol
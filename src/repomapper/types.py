@@ -1,9 +1,15 @@
 """Type definitions used across the codebase."""
 
+from dataclasses import dataclass
 from enum import Enum
 from pathlib import Path
-from typing import NamedTuple, TypedDict
+from typing import Any, FrozenSet, NamedTuple, Optional, Protocol, TypedDict
 import re
+import sys
+
+# Symbols and patterns are created in bulk, so avoid a __dict__ on each of
+# them where dataclasses support it (Python 3.10+)
+_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
 
 
 class ProcessDecision(Enum):
@@ -29,12 +35,30 @@ class CtagEntry(TypedDict, total=False):
     typeref: str
 
 
-class CompiledPattern(NamedTuple):
+@dataclass(frozen=True, **_SLOTS)
+class CompiledPattern:
     """Represents a compiled ignore pattern with its properties."""
 
-    pattern: str  # Original pattern string
     regex: re.Pattern  # Compiled regex for matching
     is_negation: bool  # True if pattern starts with !
+    source_dir_str: str  # source_dir as matched against paths, "" for git root
+    pattern: str  # Original pattern string
     is_dir_only: bool  # True if pattern ends with /
     source_dir: Path  # Directory containing this pattern (relative to git root)
     source_type: str  # 'git' or 'map'
+
+
+class RegexMatcher(Protocol):
+    """A compiled regex: an re.Pattern, or an re2 one if google-re2 is installed."""
+
+    def search(self, string: str) -> Any:
+        ...
+
+
+class PatternRun(NamedTuple):
+    """Consecutive ignore patterns of one directory, all negations or none."""
+
+    is_negation: bool  # True if the patterns start with !
+    names: FrozenSet[str]  # Literal names matching any path component
+    dir_names: FrozenSet[str]  # Literal names matching directory components
+    regex: Optional[RegexMatcher]  # Other patterns combined, None if there are none
@@ -0,0 +1,84 @@
+"""
+Shared pytest configuration for the code map generator tests.
+"""
+
+import hashlib
+import os
+from pathlib import Path
+import pytest
+
+ROOT = Path(__file__).parent.parent
+
+# RAM-backed file system for the temporary test trees, where available
+_SHM_DIR = "/dev/shm"
+
+# Hash of the single-file build inputs when the slow tests last all passed
+_BUILD_HASH_KEY = "repomapper/build_inputs_hash"
+_build_hash = pytest.StashKey[str]()
+# Slow tests of this session which have not passed yet
+_pending_slow = pytest.StashKey[set]()
+
+
+def _build_inputs_hash(slow) -> str:
+    """Hash build_single.py, the package sources it combines and the tests.
+
+    The slow tests' ids are hashed too: a hash stored by a run of only some
+    of them must not skip the others.
+    """
+    digest = hashlib.sha256()
+    for nodeid in sorted(item.nodeid for item in slow):
+        digest.update(nodeid.encode() + b"\0")
+    sources = sorted((ROOT / "src/repomapper").rglob("*.py"))
+    tests = sorted({Path(__file__), *(Path(item.path) for item in slow)})
+    for path in [ROOT / "scripts/build_single.py", *sources, *tests]:
+        digest.update(path.relative_to(ROOT).as_posix().encode() + b"\0")
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers",
+        "slow: tests of the single-file build, skipped while its inputs are "
+        "unchanged since they last passed",
+    )
+    # The tests mostly create small file trees: keep them off the disk.
+    # Only the root moves: pytest still numbers, keeps and protects its
+    # per-user directories there, and --basetemp still takes precedence.
+    if os.access(_SHM_DIR, os.W_OK):
+        os.environ.setdefault("PYTEST_DEBUG_TEMPROOT", _SHM_DIR)
+
+
+def pytest_collection_modifyitems(config, items):
+    slow = [item for item in items if item.get_closest_marker("slow")]
+    # The cache is unavailable with -p no:cacheprovider: always run them
+    cache = getattr(config, "cache", None)
+    if not slow or cache is None:
+        return
+
+    # The slow tests themselves are inputs too, as is this skipping logic
+    digest = _build_inputs_hash(slow)
+    if cache.get(_BUILD_HASH_KEY, None) == digest:
+        skip = pytest.mark.skip(reason="build inputs unchanged since last passed")
+        for item in slow:
+            item.add_marker(skip)
+    else:
+        config.stash[_build_hash] = digest
+        config.stash[_pending_slow] = {item.nodeid for item in slow}
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    outcome = yield
+    report = outcome.get_result()
+    pending = item.config.stash.get(_pending_slow, None)
+    if pending is not None and report.when == "call" and report.passed:
+        pending.discard(item.nodeid)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    config = session.config
+    pending = config.stash.get(_pending_slow, None)
+    # Only remember the inputs once every slow test ran and passed
+    if exitstatus == 0 and pending is not None and not pending:
+        config.cache.set(_BUILD_HASH_KEY, config.stash[_build_hash])
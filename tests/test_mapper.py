@@ -3,9 +3,13 @@
 Unit tests for the code map generator.
 """
 
+import io
 import os
+import shutil
+import subprocess
 import sys
 import pytest
+from concurrent.futures import Future
 from pathlib import Path
 from repomapper.handlers import (
     GenericHandler,
@@ -15,45 +19,122 @@ from repomapper.handlers import (
 )
 from repomapper.ignore import IgnorePatternManager
 from repomapper.types import CtagEntry, ProcessDecision
-from repomapper.core import CodeMapper
+from repomapper.core import CodeMapper, _CtagsFilter, _format_symbol
 from repomapper.symbols import Symbol, SymbolTree
-from repomapper.cli import main, PRODUCT_NAME, __version__
+
+# Skip instead of failing collection when the CLI cannot be imported
+_cli = pytest.importorskip("repomapper.cli")
+main = _cli.main
+PRODUCT_NAME = _cli.PRODUCT_NAME
+__version__ = _cli.__version__
+
+# Entries shared by several tests, which must not modify them
+_TEST_FUNC = CtagEntry(
+    name="test_func",
+    kind="function",
+    pattern="/^def test_func():$/",
+    signature="test_func()",
+)
+_TEST_FUNC_NO_SIG = CtagEntry(
+    name="test_func", kind="function", pattern="/^def test_func():$/"
+)
+_NESTED_FUNC = CtagEntry(
+    name="my_function",
+    scope="Module1.SubModule",
+    scopeKind="module",
+    kind="function",
+)
+_PRIVATE_METHOD = CtagEntry(
+    name="_private_method",
+    kind="method",
+    access="private",
+    pattern="/^    def _private_method(self):$/",
+)
+_PUBLIC_METHOD = CtagEntry(
+    name="public_method",
+    kind="method",
+    access="public",
+    pattern="/^    def public_method(self):$/",
+)
+
+
+def _fake_git_root(path):
+    """Make path look like a git root, without running git init."""
+    (path / ".git").mkdir()
+    (path / ".git/HEAD").write_text("ref: refs/heads/main\n")
+
+
+def _build_tree(root, spec):
+    """Create files under root, from their relative paths to their content.
+
+    Files with None content are created empty. Each parent directory is
+    created once, before the files.
+    """
+    parents = {(root / rel_path).parent for rel_path in spec}
+    for parent in sorted(parents, key=lambda p: len(p.parts)):
+        parent.mkdir(parents=True, exist_ok=True)
+    for rel_path, content in spec.items():
+        path = root / rel_path
+        if content is None:
+            os.close(os.open(path, os.O_CREAT | os.O_WRONLY, 0o644))
+        else:
+            path.write_text(content)
+
+
+# Ignore files of the ignore_manager repository
+_GITIGNORE_ROOT = "*.pyc\n/dist/\n!important.pyc"
+_GITIGNORE_NESTED = "temp/\n*.log"
 
 
 # Fixtures for creating temporary git repositories with ignore files
 @pytest.fixture
 def git_repo(tmp_path):
     """Create a temporary git repository with a basic structure."""
-    # Initialize git repo
+    # Initialize git repo, IgnorePatternManager is given its path
     repo_dir = tmp_path / "repo"
     repo_dir.mkdir()
-    os.chdir(repo_dir)
-    os.system("git init")
+    _fake_git_root(repo_dir)
 
     return repo_dir
 
 
+@pytest.fixture(scope="session")
+def _prebuilt_repo(tmp_path_factory):
+    """Build the small repository most file listing tests use, once."""
+    repo_dir = tmp_path_factory.mktemp("prebuilt") / "repo"
+    _build_tree(
+        repo_dir,
+        {
+            "src/test.ml": None,
+            "src/test.mli": None,
+            "src/script.sh": None,
+            "src/ignored.pyc": None,
+            ".git/HEAD": "ref: refs/heads/main\n",
+            ".gitignore": "*.pyc\n",
+        },
+    )
+    return repo_dir
+
+
+@pytest.fixture
+def repo_clone(tmp_path, _prebuilt_repo):
+    """Copy the prebuilt repository for a test, which may add files to it.
+
+    Files are hard links to the prebuilt ones, so they must not be modified.
+    """
+    return shutil.copytree(_prebuilt_repo, tmp_path / "repo", copy_function=os.link)
+
+
 @pytest.fixture
 def ignore_manager(git_repo):
     """Create an IgnorePatternManager instance for testing."""
     # Create standard ignore files first
-    (git_repo / ".gitignore").write_text(
-        """
-*.pyc
-/dist/
-!important.pyc
-""".strip()
-    )
+    (git_repo / ".gitignore").write_text(_GITIGNORE_ROOT)
 
     # Create nested ignore files
     (git_repo / "src").mkdir(exist_ok=True)
     (git_repo / "src/lib").mkdir(exist_ok=True)
-    (git_repo / "src/lib/.gitignore").write_text(
-        """
-temp/
-*.log
-""".strip()
-    )
+    (git_repo / "src/lib/.gitignore").write_text(_GITIGNORE_NESTED)
 
     return IgnorePatternManager(git_repo)
 
@@ -115,42 +196,64 @@ def test_collect_ignore_patterns(git_repo, ignore_manager):
     assert patterns[Path(".")]["map"] == ["dune", "*.install"]
 
 
+def test_ignored_dirs_not_collected(git_repo):
+    """Test that ignore files inside ignored directories are not read, as in git."""
+    (git_repo / ".gitignore").write_text("build/\n")
+    (git_repo / "build/sub").mkdir(parents=True)
+    (git_repo / "build/.gitignore").write_text("!keep.ml\n")
+    (git_repo / "build/sub/.gitignore").write_text("*.log\n")
+
+    manager = IgnorePatternManager(git_repo)
+    assert set(manager.patterns_by_dir) == {Path(".")}
+    assert manager.should_ignore("build/keep.ml")
+
+
+def test_refresh_on_ignore_change(git_repo, ignore_manager):
+    """Test that cached decisions are dropped when an ignore file changes."""
+    assert ignore_manager.should_ignore(Path("src/lib/file.log"))
+    assert not ignore_manager.refresh()  # Nothing changed yet
+
+    gitignore = git_repo / "src/lib/.gitignore"
+    gitignore.write_text("temp/")
+    mtime = gitignore.stat().st_mtime_ns
+    os.utime(gitignore, ns=(mtime + 10**9, mtime + 10**9))
+
+    assert ignore_manager.refresh()
+    assert not ignore_manager.should_ignore(Path("src/lib/file.log"))
+
+
 # Add new fixtures
-@pytest.fixture
+@pytest.fixture(scope="module")
 def ocaml_handler():
     """Create an OCamlHandler instance for testing."""
     return OCamlHandler()
 
 
 # Test OCaml functionality
-def test_ocaml_file_processing(ocaml_handler):
+def test_ocaml_file_processing(ocaml_handler, tmp_path):
     """Test OCaml file processing rules."""
     # Should process .mli files
     assert (
-        ocaml_handler.should_process_file(Path("test.mli")) == ProcessDecision.PROCESS
+        ocaml_handler.should_process_file(tmp_path / "test.mli")
+        == ProcessDecision.PROCESS
     )
 
     # Should process .ml files without corresponding .mli
-    assert ocaml_handler.should_process_file(Path("only.ml")) == ProcessDecision.PROCESS
+    assert (
+        ocaml_handler.should_process_file(tmp_path / "only.ml")
+        == ProcessDecision.PROCESS
+    )
 
     # Should not process .ml files that have .mli counterpart
-    ml_with_mli = Path("test.ml")
-    mli_path = ml_with_mli.with_suffix(".mli")
-    mli_path.touch()  # Create the .mli file
+    ml_with_mli = tmp_path / "test.ml"
+    ml_with_mli.with_suffix(".mli").touch()  # Create the .mli file
     assert ocaml_handler.should_process_file(ml_with_mli) == ProcessDecision.SKIP
-    mli_path.unlink()  # Clean up
 
 
 def test_ocaml_module_path(ocaml_handler):
     """Test module path extraction from OCaml symbols."""
     # Test nested module path
-    entry = CtagEntry(
-        name="my_function",
-        scope="Module1.SubModule",
-        scopeKind="module",
-        kind="function",
-    )
-    assert ocaml_handler._get_module_path(entry) == ["Module1", "SubModule"]
+    assert ocaml_handler._get_module_path(_NESTED_FUNC) == ["Module1", "SubModule"]
 
     # Test single module
     entry = CtagEntry(name="my_type", scope="module:MyModule", kind="type")
@@ -161,85 +264,75 @@ def test_ocaml_module_path(ocaml_handler):
     assert ocaml_handler._get_module_path(entry) == []
 
 
-def test_ocaml_symbol_categorization(ocaml_handler):
+OCAML_CATEGORY_CASES = [
+    # Functions, including operators
+    (
+        CtagEntry(
+            name="my_function",
+            kind="function",
+            signature="val my_function : int -> string",
+        ),
+        "Functions",
+    ),
+    (
+        CtagEntry(name="(+)", kind="function", signature="val (+) : int -> int -> int"),
+        "Functions",
+    ),
+    (CtagEntry(name="my_type", kind="type", signature="type my_type = int"), "Types"),
+    (
+        CtagEntry(name="MyModule", kind="module", signature="sig\n  val x : int\nend"),
+        "Modules",
+    ),
+    # Module aliases are modules too
+    (CtagEntry(name="MyAlias", kind="module", signature="= MyModule"), "Modules"),
+]
+
+
+@pytest.mark.parametrize("entry,expected", OCAML_CATEGORY_CASES)
+def test_ocaml_symbol_categorization(ocaml_handler, entry, expected):
     """Test OCaml symbol categorization."""
-    # Test function categorization
-    func_entry = CtagEntry(
-        name="my_function", kind="function", signature="val my_function : int -> string"
-    )
-    assert ocaml_handler.categorize_symbol(func_entry) == "Functions"
+    assert ocaml_handler.categorize_symbol(entry) == expected
 
-    # Test operator categorization
-    op_entry = CtagEntry(
-        name="(+)", kind="function", signature="val (+) : int -> int -> int"
-    )
-    assert ocaml_handler.categorize_symbol(op_entry) == "Functions"
-
-    # Test type categorization
-    type_entry = CtagEntry(name="my_type", kind="type", signature="type my_type = int")
-    assert ocaml_handler.categorize_symbol(type_entry) == "Types"
 
-    # Test module categorization
-    module_entry = CtagEntry(
-        name="MyModule", kind="module", signature="sig\n  val x : int\nend"
-    )
-    assert ocaml_handler.categorize_symbol(module_entry) == "Modules"
-
-    # Test module alias categorization
-    module_alias_entry = CtagEntry(
-        name="MyAlias", kind="module", signature="= MyModule"
-    )
-    assert ocaml_handler.categorize_symbol(module_alias_entry) == "Modules"
-
-
-def test_ocaml_symbol_filtering(ocaml_handler):
-    """Test OCaml symbol filtering."""
+OCAML_FILTER_CASES = [
     # Should filter out implementation details
-    impl_entry = CtagEntry(
-        name="internal", kind="function", pattern="/^let internal = {$/"
-    )
-    assert not ocaml_handler.filter_symbol(impl_entry)
-
+    (
+        CtagEntry(name="internal", kind="function", pattern="/^let internal = {$/"),
+        False,
+    ),
     # Should filter out docstrings
-    doc_entry = CtagEntry(
-        name="doc", kind="function", pattern="/^(** Documentation *)$/"
-    )
-    assert not ocaml_handler.filter_symbol(doc_entry)
-
+    (CtagEntry(name="doc", kind="function", pattern="/^(** Documentation *)$/"), False),
     # Should keep normal functions
-    normal_entry = CtagEntry(
-        name="valid_function",
-        kind="function",
-        pattern="/^let valid_function x = x + 1$/",
-    )
-    assert ocaml_handler.filter_symbol(normal_entry)
+    (
+        CtagEntry(
+            name="valid_function",
+            kind="function",
+            pattern="/^let valid_function x = x + 1$/",
+        ),
+        True,
+    ),
+]
 
 
-def test_handler_interface_defaults(generic_handler):
-    """Test default implementations of handler interface methods."""
-    entry = CtagEntry(
-        name="test_func",
-        kind="function",
-        pattern="/^def test_func():$/",
-        signature="test_func()",
-    )
+@pytest.mark.parametrize("entry,expected", OCAML_FILTER_CASES)
+def test_ocaml_symbol_filtering(ocaml_handler, entry, expected):
+    """Test OCaml symbol filtering."""
+    assert ocaml_handler.filter_symbol(entry) == expected
 
-    # Test get_symbol_description with signature
-    assert generic_handler.get_symbol_description(entry) == "test_func()"
 
-    # Test get_symbol_description with pattern only
-    entry_no_sig = CtagEntry(
-        name="test_func",
-        kind="function",
-        pattern="/^def test_func():$/",
-    )
-    assert generic_handler.get_symbol_description(entry_no_sig) == "def test_func():"
+HANDLER_DEFAULT_CASES = [
+    # Descriptions prefer signatures over patterns
+    ("get_symbol_description", _TEST_FUNC, "test_func()"),
+    ("get_symbol_description", _TEST_FUNC_NO_SIG, "def test_func():"),
+    ("get_module_path", _TEST_FUNC, ""),
+    ("get_symbol_name", _TEST_FUNC, "test_func"),
+]
 
-    # Test get_module_path default
-    assert generic_handler.get_module_path(entry) == ""
 
-    # Test get_symbol_name default
-    assert generic_handler.get_symbol_name(entry) == "test_func"
+@pytest.mark.parametrize("method,entry,expected", HANDLER_DEFAULT_CASES)
+def test_handler_interface_defaults(generic_handler, method, entry, expected):
+    """Test default implementations of handler interface methods."""
+    assert getattr(generic_handler, method)(entry) == expected
 
 
 def test_ocaml_handler_interface(ocaml_handler):
@@ -253,20 +346,14 @@ def test_ocaml_handler_interface(ocaml_handler):
     assert ocaml_handler.get_symbol_description(entry) == "test_func x = x + 1"
 
     # Test module path handling
-    module_entry = CtagEntry(
-        name="func",
-        kind="function",
-        scope="Module1.SubModule",
-        scopeKind="module",
-    )
-    assert ocaml_handler.get_module_path(module_entry) == "Module1.SubModule"
+    assert ocaml_handler.get_module_path(_NESTED_FUNC) == "Module1.SubModule"
 
     # Test symbol name handling
-    assert ocaml_handler.get_symbol_name(module_entry) == "func"
+    assert ocaml_handler.get_symbol_name(_NESTED_FUNC) == "my_function"
 
 
 # Add new fixture
-@pytest.fixture
+@pytest.fixture(scope="module")
 def shell_handler():
     """Create a ShellHandler instance for testing."""
     return ShellHandler()
@@ -284,37 +371,48 @@ def test_shell_file_processing(shell_handler):
     assert shell_handler.should_process_file(Path("script"))
 
 
-def test_shell_symbol_categorization(shell_handler):
-    """Test shell script symbol categorization."""
-    # Test function with 'function' keyword
-    func_entry = CtagEntry(
-        name="my_function", kind="function", pattern="/^function my_function() {$/"
-    )
-    assert shell_handler.categorize_symbol(func_entry) == "Functions"
+SHELL_CATEGORY_CASES = [
+    # Function with 'function' keyword
+    (
+        CtagEntry(
+            name="my_function",
+            kind="function",
+            pattern="/^function my_function() {$/",
+        ),
+        "Functions",
+    ),
+    # Function without 'function' keyword should return None
+    (
+        CtagEntry(
+            name="other_function", kind="function", pattern="/^other_function() {$/"
+        ),
+        None,
+    ),
+    # Non-function should return None
+    (CtagEntry(name="MY_VAR", kind="variable", pattern="/^MY_VAR=42$/"), None),
+]
 
-    # Test function without 'function' keyword should return None
-    func_entry2 = CtagEntry(
-        name="other_function", kind="function", pattern="/^other_function() {$/"
-    )
-    assert shell_handler.categorize_symbol(func_entry2) is None
 
-    # Test non-function should return None
-    var_entry = CtagEntry(name="MY_VAR", kind="variable", pattern="/^MY_VAR=42$/")
-    assert shell_handler.categorize_symbol(var_entry) is None
+@pytest.mark.parametrize("entry,expected", SHELL_CATEGORY_CASES)
+def test_shell_symbol_categorization(shell_handler, entry, expected):
+    """Test shell script symbol categorization."""
+    assert shell_handler.categorize_symbol(entry) == expected
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def markdown_handler():
     """Create a MarkdownHandler instance for testing."""
     return MarkdownHandler()
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def generic_handler():
     """Create a GenericHandler instance for testing."""
     return GenericHandler(debug=False)
 
 
+# Handlers hold no state and are shared, but tests set up CodeMapper's own
+# ignore manager and output file, so each gets a fresh one
 @pytest.fixture
 def code_mapper():
     """Create a CodeMapper instance for testing."""
@@ -367,28 +465,32 @@ Not a #header
     ]
 
 
-def test_markdown_header_edge_cases(tmp_path, markdown_handler):
-    """Test edge cases in Markdown header extraction."""
-    md_file = tmp_path / "edge_cases.md"
-    md_file.write_text(
-        """
-#Not a header
-# Header with #hash# in it
-##No space
-# Header with trailing space 
- # Header with leading space
-""".strip()
-    )
+def test_markdown_header_cache(tmp_path, markdown_handler):
+    """Test that cached headers are refreshed when the file changes."""
+    md_file = tmp_path / "cached.md"
+    md_file.write_text("# First\n")
+    assert markdown_handler.extract_headers(md_file) == [(1, 1, "First")]
 
-    headers = markdown_handler.extract_headers(md_file)
+    md_file.write_text("Intro\n## Second\n")
+    assert markdown_handler.extract_headers(md_file) == [(2, 2, "Second")]
 
-    # Should only match proper headers (space after #)
-    assert len(headers) == 3
-    assert headers == [
-        (2, 1, "Header with #hash# in it"),
-        (4, 1, "Header with trailing space"),
-        (5, 1, "Header with leading space"),
-    ]
+
+@pytest.mark.parametrize(
+    "line,expected",
+    [
+        # Should only match proper headers (space after #)
+        ("#Not a header", []),
+        ("# Header with #hash# in it", [(1, 1, "Header with #hash# in it")]),
+        ("##No space", []),
+        ("# Header with trailing space ", [(1, 1, "Header with trailing space")]),
+        (" # Header with leading space", [(1, 1, "Header with leading space")]),
+    ],
+)
+def test_markdown_header_edge_cases(tmp_path, markdown_handler, line, expected):
+    """Test edge cases in Markdown header extraction."""
+    md_file = tmp_path / "edge_cases.md"
+    md_file.write_text(line + "\n")
+    assert markdown_handler.extract_headers(md_file) == expected
 
 
 def test_cli_help(capsys):
@@ -413,16 +515,15 @@ def test_cli_version(capsys):
     assert f"{PRODUCT_NAME} v{__version__}" in captured.out
 
 
-def test_cli_output_file(tmp_path):
+def test_map_output_file(tmp_path, code_mapper):
     """Test writing to a custom output file."""
     output_file = tmp_path / "custom.md"
-    sys.argv = ["repomapper.py", "-o", str(output_file), str(tmp_path)]
 
     # Create a test file to map
     test_file = tmp_path / "test.md"
     test_file.write_text("# Test Header\n## Section")
 
-    main()
+    code_mapper.generate_map(tmp_path, output_path=str(output_file))
 
     assert output_file.exists()
     content = output_file.read_text()
@@ -431,139 +532,114 @@ def test_cli_output_file(tmp_path):
     assert "Section" in content
 
 
-def test_cli_stdout(capsys, tmp_path):
-    """Test writing to stdout."""
-    sys.argv = ["repomapper.py", "-o", "-", str(tmp_path)]
-
+def test_map_to_stream(tmp_path, code_mapper):
+    """Test writing to a file object, as done for stdout."""
     # Create a test file to map
     test_file = tmp_path / "test.md"
     test_file.write_text("# Test Header\n## Section")
 
-    main()
+    output = io.StringIO()
+    code_mapper.generate_map(tmp_path, output)
 
-    captured = capsys.readouterr()
-    assert "# This file was automatically generated." in captured.out
-    assert "Test Header" in captured.out
-    assert "Section" in captured.out
+    assert "# This file was automatically generated." in output.getvalue()
+    assert "Test Header" in output.getvalue()
+    assert "Section" in output.getvalue()
 
 
-def test_cli_list_mode(capsys, tmp_path):
-    """Test --list mode output."""
-    # Create test files
-    (tmp_path / "src").mkdir()
-    (tmp_path / "src/test.ml").touch()
-    (tmp_path / "src/test.mli").touch()
-    (tmp_path / "src/script.sh").touch()
-    (tmp_path / "src/ignored.pyc").touch()
-
-    # Initialize git repo
-    os.chdir(tmp_path)
-    os.system("git init")
-    (tmp_path / ".gitignore").write_text("*.pyc\n")
-
-    # Run with --list
-    sys.argv = ["repomapper.py", "--list", str(tmp_path)]
-    main()
+LIST_FILES_CASES = [
+    # Included files only, as relative paths
+    (
+        {},
+        {"src/test.mli", "src/script.sh"},
+        {"src/ignored.pyc", "src/test.ml"},  # test.ml excluded due to .mli
+    ),
+    # All files with status indicators
+    (
+        {"show_all": True},
+        {"I src/test.mli", "I src/script.sh", ". src/ignored.pyc", ". src/test.ml"},
+        set(),
+    ),
+]
 
-    captured = capsys.readouterr()
-    output_lines = captured.out.strip().split("\n")
-    # Should show included files (relative paths)
-    assert "src/test.mli" in output_lines
-    assert "src/script.sh" in output_lines
-    # Should not show excluded files
-    assert "src/ignored.pyc" not in output_lines
-    assert "src/test.ml" not in output_lines  # Excluded due to .mli
-
-
-def test_cli_list_all_mode(capsys, tmp_path):
-    """Test --list --all mode output."""
-    # Create test files
-    (tmp_path / "src").mkdir()
-    (tmp_path / "src/test.ml").touch()
-    (tmp_path / "src/test.mli").touch()
-    (tmp_path / "src/script.sh").touch()
-    (tmp_path / "src/ignored.pyc").touch()
-
-    # Initialize git repo
-    os.chdir(tmp_path)
-    os.system("git init")
-    (tmp_path / ".gitignore").write_text("*.pyc\n")
-
-    # Run with --list --all
-    sys.argv = ["repomapper.py", "--list", "--all", str(tmp_path)]
+
+@pytest.mark.parametrize("kwargs, included, excluded", LIST_FILES_CASES)
+def test_list_files(_prebuilt_repo, code_mapper, kwargs, included, excluded):
+    """Test listing files, with and without the excluded ones."""
+    output = io.StringIO()
+    code_mapper.list_files(_prebuilt_repo, output=output, **kwargs)
+
+    output_lines = set(output.getvalue().strip().split("\n"))
+    assert included <= output_lines
+    assert not excluded & output_lines
+
+
+def test_cli_list_mode(capsys, _prebuilt_repo, monkeypatch):
+    """Test --list mode output through the CLI."""
+    # Listing does not write anything, so the prebuilt repository is shared
+    monkeypatch.chdir(_prebuilt_repo)
+
+    sys.argv = ["repomapper.py", "--list", "--debug", str(_prebuilt_repo)]
     main()
 
     captured = capsys.readouterr()
-    # Should show all files with status indicators
-    assert "I src/test.mli" in captured.out  # Included
-    assert "I src/script.sh" in captured.out  # Included
-    assert ". src/ignored.pyc" in captured.out  # Excluded by gitignore
-    assert ". src/test.ml" in captured.out  # Excluded due to .mli
+    output_lines = set(captured.out.strip().split("\n"))
+    assert {"src/test.mli", "src/script.sh"} <= output_lines
+    assert not {"src/ignored.pyc", "src/test.ml"} & output_lines
+    assert "DEBUG: Git root found at:" in captured.err
 
 
-def test_cli_list_debug_mode(capsys, tmp_path):
-    """Test --list with --debug flag."""
+def test_list_files_debug(capsys, tmp_path):
+    """Test listing files with debug output."""
     # Create test file
     (tmp_path / "test.ml").touch()
+    _fake_git_root(tmp_path)
 
-    # Initialize git repo
-    os.chdir(tmp_path)
-    os.system("git init")
-
-    # Run with --list --debug
-    sys.argv = ["repomapper.py", "--list", "--debug", str(tmp_path)]
-    main()
+    output = io.StringIO()
+    CodeMapper(debug=True).list_files(tmp_path, output=output)
 
     captured = capsys.readouterr()
     # Should show debug messages
-    assert "DEBUG: Debug mode enabled" in captured.err
     assert "DEBUG: Git root found at:" in captured.err
-    assert "DEBUG: Running ctags..." in captured.err
+    # Listing does not need ctags
+    assert "DEBUG: Running ctags..." not in captured.err
     # Should still show normal output
-    assert "test.ml" in captured.out
+    assert "test.ml" in output.getvalue()
 
 
-def test_cli_list_empty_dir(capsys, tmp_path):
-    """Test --list with an empty directory."""
+def test_list_files_empty_dir(tmp_path, code_mapper):
+    """Test listing files of an empty directory."""
     # Initialize empty git repo
-    os.chdir(tmp_path)
-    os.system("git init")
+    _fake_git_root(tmp_path)
 
-    # Run with --list
-    sys.argv = ["repomapper.py", "--list", str(tmp_path)]
-    main()
+    output = io.StringIO()
+    code_mapper.list_files(tmp_path, output=output)
 
-    captured = capsys.readouterr()
     # Should have no output for empty dir
-    assert not captured.out.strip()
+    assert not output.getvalue().strip()
 
 
-def test_cli_list_absolute_path(capsys, tmp_path):
-    """Test --list with absolute vs relative paths."""
+def test_list_files_absolute_path(tmp_path, monkeypatch, code_mapper):
+    """Test listing files with absolute vs relative paths."""
     # Create test file in a subdirectory
     subdir = tmp_path / "subdir"
     subdir.mkdir()
     test_file = subdir / "test.sh"
     test_file.touch()
-
-    # Initialize git repo
-    os.chdir(tmp_path)
-    os.system("git init")
+    _fake_git_root(tmp_path)
 
     # Test with relative path
-    os.chdir(subdir)
-    sys.argv = ["repomapper.py", "--list", "."]
-    main()
-    captured = capsys.readouterr()
-    assert "test.sh" in captured.out  # Should show relative path
+    monkeypatch.chdir(subdir)
+    output = io.StringIO()
+    code_mapper.list_files(Path("."), output=output)
+    assert "subdir/test.sh" in output.getvalue()  # Relative to git root
 
     # Test with absolute path
-    sys.argv = ["repomapper.py", "--list", str(subdir)]
-    main()
-    captured = capsys.readouterr()
-    assert "test.sh" in captured.out  # Should still show relative path
+    output = io.StringIO()
+    code_mapper.list_files(subdir, output=output)
+    assert "subdir/test.sh" in output.getvalue()  # Should still be relative
 
 
+@pytest.mark.slow
 def test_build_single(tmp_path):
     """Test the build_single.py script functionality."""
     from scripts.build_single import combine_files
@@ -601,6 +677,7 @@ def hello():
     assert content.strip().endswith("main()")  # Ends with main() call
 
 
+@pytest.mark.slow
 def test_build_imports(tmp_path):
     """Test that the build script handles imports correctly."""
     from scripts.build_single import combine_files, get_imports
@@ -648,6 +725,7 @@ def func2(): return 42
     assert "def func1():" in content  # Function should be included
 
 
+@pytest.mark.slow
 def test_build_duplicate_prevention(tmp_path):
     """Test that the build script prevents duplicate code."""
     from scripts.build_single import combine_files
@@ -677,74 +755,36 @@ PRODUCT_NAME = "Test"
 
 def test_private_member_filtering(code_mapper):
     """Test filtering of private members."""
-    # Create a test entry with private access
-    private_entry = CtagEntry(
-        name="_private_method",
-        kind="method",
-        access="private",
-        pattern="/^    def _private_method(self):$/",
-    )
-
-    # Create a test entry with public access
-    public_entry = CtagEntry(
-        name="public_method",
-        kind="method",
-        access="public",
-        pattern="/^    def public_method(self):$/",
-    )
-
     # Test with generic handler
-    assert not code_mapper.generic_handler.filter_symbol(private_entry)
-    assert code_mapper.generic_handler.filter_symbol(public_entry)
+    assert not code_mapper.generic_handler.filter_symbol(_PRIVATE_METHOD)
+    assert code_mapper.generic_handler.filter_symbol(_PUBLIC_METHOD)
 
 
-def test_comment_cleanup(code_mapper):
+@pytest.mark.parametrize(
+    "pattern,expected",
+    [
+        ("def func1(): # A comment", "def func1():"),
+        ("def func2():  // C++ style", "def func2():"),
+        ("def func3():    # Multiple spaces", "def func3():"),
+        ("def func4(): pass # Trailing code", "def func4(): pass"),
+        ("def no_comment():", "def no_comment():"),
+    ],
+)
+def test_comment_cleanup(pattern, expected):
     """Test cleanup of comments from symbol descriptions."""
-    # Create a test file and symbol tree
-    tree = code_mapper.file_trees[Path("test.py")] = SymbolTree()
-
-    # Test various comment styles
-    symbols = [
-        Symbol(
-            name="func1", kind="function", pattern="def func1(): # A comment", line=1
-        ),
-        Symbol(
-            name="func2", kind="function", pattern="def func2():  // C++ style", line=2
-        ),
-        Symbol(
-            name="func3",
-            kind="function",
-            pattern="def func3():    # Multiple spaces",
-            line=3,
-        ),
-        Symbol(
-            name="func4",
-            kind="function",
-            pattern="def func4(): pass # Trailing code",
-            line=4,
-        ),
-        Symbol(name="no_comment", kind="function", pattern="def no_comment():", line=5),
-    ]
+    symbol = Symbol(name="func", kind="function", pattern=pattern, line=1)
+    assert _format_symbol(symbol) == f"(1) func: {expected}"
 
-    # Add symbols to tree
-    for symbol in symbols:
-        tree.add_symbol(symbol)
 
-    # Use StringIO to capture output
-    from io import StringIO
-
-    output = StringIO()
-    code_mapper._write_map(output, {Path("test.py"): {}})
-    result = output.getvalue()
-
-    # Verify comments are removed
-    assert "def func1():" in result
-    assert "# A comment" not in result
-    assert "// C++ style" not in result
-    assert "# Multiple spaces" not in result
-    assert "def func4(): pass" in result
-    assert "# Trailing code" not in result
-    assert "def no_comment():" in result
+@pytest.mark.parametrize(
+    "content,lines",
+    [(b"", 0), (b"one\n", 1), (b"one\ntwo", 2), (b"one\r\ntwo\r\n", 2)],
+)
+def test_file_info_line_count(tmp_path, code_mapper, content, lines):
+    """Test line counting in file metadata."""
+    test_file = tmp_path / "test.txt"
+    test_file.write_bytes(content)
+    assert code_mapper._get_file_info(test_file) == f"  Size: {lines} lines"
 
 
 def test_duplicate_symbol_handling(code_mapper):
@@ -786,45 +826,31 @@ def test_duplicate_symbol_handling(code_mapper):
     assert enum_class.children[0].name in {"MyEnum.VALUE", "VALUE"}
 
 
-def test_file_discovery(tmp_path, code_mapper):
+def test_file_discovery(repo_clone, monkeypatch, code_mapper):
     """Test file discovery and filtering."""
-    # Create a test directory structure
-    src = tmp_path / "src"
-    src.mkdir()
-
-    # Create various test files
-    (src / "test.ml").touch()
-    (src / "test.mli").touch()
-    (src / "only.ml").touch()  # ML file without MLI
-    (src / "script.sh").touch()
-    (src / "script.bash").touch()
-    (src / "ignored.pyc").touch()
-    (src / ".hidden").touch()
-
-    # Create a hidden directory with valid files (should be skipped)
-    hidden_dir = src / ".git"
-    hidden_dir.mkdir()
-    (hidden_dir / "valid.ml").touch()
-
-    # Create nested directories
-    lib = src / "lib"
-    lib.mkdir()
-    (lib / "module.ml").touch()
-    (lib / "module.mli").touch()  # This should cause module.ml to be skipped
-
-    # Initialize git repo for ignore pattern testing
-    os.chdir(tmp_path)
-    os.system("git init")
-
-    # Add ignore patterns
-    (tmp_path / ".gitignore").write_text("*.pyc\n")
+    # Add to the test directory structure (src/test.ml, src/test.mli,
+    # src/script.sh and src/ignored.pyc, with *.pyc ignored)
+    _build_tree(
+        repo_clone,
+        {
+            "src/only.ml": None,  # ML file without MLI
+            "src/script.bash": None,
+            "src/.hidden": None,
+            # A hidden directory with valid files (should be skipped)
+            "src/.git/valid.ml": None,
+            # This MLI should cause module.ml to be skipped
+            "src/lib/module.ml": None,
+            "src/lib/module.mli": None,
+        },
+    )
+    monkeypatch.chdir(repo_clone)
 
     # Get processable files
-    code_mapper.ignore_manager = IgnorePatternManager(tmp_path)
-    files = code_mapper._get_processable_files(tmp_path)
+    code_mapper.ignore_manager = IgnorePatternManager(repo_clone)
+    files = code_mapper._get_processable_files(repo_clone)
 
     # Convert to set of relative paths for easier comparison
-    rel_files = {str(f.relative_to(tmp_path)) for f in files}
+    rel_files = {str(Path(f).relative_to(repo_clone)) for f in files}
 
     # Verify expected files - test.ml should be skipped due to test.mli
     assert rel_files == {
@@ -836,6 +862,260 @@ def test_file_discovery(tmp_path, code_mapper):
     }
 
 
+def test_ignored_dirs_are_pruned(tmp_path, code_mapper, monkeypatch):
+    """Test that ignored directories are skipped, whatever negations follow."""
+    _fake_git_root(tmp_path)
+    (tmp_path / ".gitignore").write_text("build/\n*.log\n!keep.pyc\n")
+    (tmp_path / "build").mkdir()
+    (tmp_path / "build/gen.ml").touch()
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src/.gitignore").write_text("!keep.log\n")
+    (tmp_path / "src/main.ml").touch()
+
+    code_mapper.ignore_manager = IgnorePatternManager(tmp_path)
+    # As in git, negations cannot re-include files inside an ignored directory
+    assert code_mapper.ignore_manager.should_ignore_dir("build")
+    assert code_mapper.ignore_manager.should_ignore("build/keep.pyc")
+    assert code_mapper.ignore_manager.should_ignore_dir("old.log/")
+    assert code_mapper.ignore_manager.should_ignore_dir("src/old.log")
+    assert not code_mapper.ignore_manager.should_ignore_dir("src")
+
+    listed = []
+    scandir = os.scandir
+    monkeypatch.setattr(
+        os, "scandir", lambda path: listed.append(os.fspath(path)) or scandir(path)
+    )
+    files = code_mapper._get_processable_files(tmp_path)
+    rel_files = {str(Path(f).relative_to(tmp_path.resolve())) for f in files}
+    assert rel_files == {"src/main.ml"}
+    assert not [path for path in listed if "build" in path]
+
+
+def test_ignore_files_found_during_walk(tmp_path, code_mapper):
+    """Test that a manager without its own scan reads ignore files as they are walked."""
+    _fake_git_root(tmp_path)
+    (tmp_path / ".gitignore").write_text("build/\n")
+    (tmp_path / "src/gen").mkdir(parents=True)
+    (tmp_path / "src/.gitignore").write_text("gen/\n*.log\n")
+    (tmp_path / "src/main.ml").touch()
+    (tmp_path / "src/gen/gen.ml").touch()
+    (tmp_path / "src/debug.log").touch()
+
+    code_mapper.ignore_manager = IgnorePatternManager(tmp_path, scan_tree=False)
+    assert set(code_mapper.ignore_manager.patterns_by_dir) == {Path(".")}
+
+    files = code_mapper._get_processable_files(tmp_path)
+    rel_files = {str(Path(f).relative_to(tmp_path.resolve())) for f in files}
+    assert rel_files == {"src/main.ml"}
+    assert set(code_mapper.ignore_manager.patterns_by_dir) == {Path("."), Path("src")}
+
+
+def test_check_directory_removed_ignore_file(tmp_path):
+    """Test that an ignore file removed once found is treated as absent."""
+    _fake_git_root(tmp_path)
+    manager = IgnorePatternManager(tmp_path, scan_tree=False)
+
+    # As if a walk listed a .gitignore which was deleted right after
+    manager.check_directory(str(tmp_path.resolve() / "src"), {".gitignore"})
+    assert set(manager.patterns_by_dir) == set()
+
+
+def test_watch_update_entries(tmp_path, code_mapper):
+    """Test that watch mode only tags files that changed or appeared."""
+    _fake_git_root(tmp_path)
+    root = tmp_path.resolve()
+    (root / "a.ml").touch()
+    (root / "b.ml").touch()
+
+    code_mapper.output_file = None
+    code_mapper.ignore_manager = IgnorePatternManager(root)
+    entries = {path: [] for path in code_mapper._get_processable_files(root)}
+    tagged = []
+
+    def tag_file(path):
+        tagged.append(os.path.basename(path))
+        return [{"name": "x", "path": path, "kind": "value", "line": 1}]
+
+    # A content change only tags the file itself, no walk needed
+    a, b, c = str(root / "a.ml"), str(root / "b.ml"), str(root / "c.ml")
+    assert code_mapper._update_entries(root, {a}, False, entries, tag_file)
+    assert tagged == ["a.ml"] and entries[a] and not entries[b]
+
+    # Changes to files outside the map are ignored
+    assert not code_mapper._update_entries(
+        root, {str(root / "x.txt")}, False, entries, tag_file
+    )
+
+    # New and deleted files are found by walking again
+    (root / "b.ml").unlink()
+    (root / "c.ml").touch()
+    assert code_mapper._update_entries(root, {b, c}, True, entries, tag_file)
+    assert tagged == ["a.ml", "c.ml"] and set(entries) == {a, c}
+
+    # New ignore files are picked up
+    (root / ".gitignore").write_text("c.ml\n")
+    changed = {str(root / ".gitignore")}
+    assert code_mapper._update_entries(root, changed, False, entries, tag_file)
+    assert set(entries) == {a}
+
+
+@pytest.mark.parametrize("walk_first", [True, False])
+def test_tagged_entries(code_mapper, monkeypatch, walk_first):
+    """Test that only entries of processable files are kept from ctags."""
+    walk = Future()
+
+    def run_ctags(directory):
+        if walk_first:
+            walk.set_result({"a.ml": None})
+        yield {"name": "x", "path": "b.ml"}
+        yield {"name": "y", "path": "a.ml"}
+        if not walk_first:
+            walk.set_result({"a.ml": None})
+        yield {"name": "z", "path": "b.ml"}
+
+    monkeypatch.setattr(code_mapper, "_run_ctags", run_ctags)
+    entries = code_mapper._tagged_entries(Path("."), walk)
+    assert [entry["name"] for entry in entries] == ["y"]
+
+
+@pytest.mark.parametrize("command", [["true"], ["false"]])
+def test_ctags_filter_early_exit(capsys, command):
+    """Test that a ctags process ending without answering is reported."""
+    ctags = _CtagsFilter.__new__(_CtagsFilter)
+    ctags.cmd = command
+    ctags.proc = subprocess.Popen(
+        command, stdin=subprocess.PIPE, stdout=subprocess.PIPE
+    )
+
+    with pytest.raises(SystemExit):
+        ctags.tag_file("a.ml")
+    err = capsys.readouterr().err
+    if command == ["true"]:
+        assert "exited before answering a.ml" in err
+        assert "exit status 0" not in err
+    else:
+        assert "non-zero exit status 1" in err
+
+
+@pytest.mark.parametrize(
+    "pattern,path,should_ignore",
+    [
+        ("**/foo", "a/b/foo", True),  # Leading ** matches in any directory
+        ("foo/**", "foo/x/y", True),  # Trailing ** matches everything inside
+        ("foo/**", "foo/", False),  # ...but not the directory itself
+        ("a/**/b", "a/b", True),  # Inner ** matches zero directories
+        ("a/**/b", "a/x/y/b", True),  # ...or more
+        ("src/*.py", "src/main.py", True),  # Inner / anchors to the directory
+        ("src/*.py", "lib/src/main.py", False),
+        ("build/*", "build/", False),  # * matches a name, never nothing
+        ("*.[ao]", "lib.o", True),  # Character class
+        ("[!x]y", "xy", False),  # Negated character class
+        ("\\#notes", "#notes", True),  # Escaped comment character
+        ("\\!bang", "!bang", True),  # Escaped negation
+        ("a # b", "a # b", True),  # Only leading # starts a comment
+        ("trail  ", "trail", True),  # Trailing spaces are ignored
+        ("trail\\ ", "trail ", True),  # ...unless escaped
+    ],
+)
+def test_gitignore_semantics(git_repo, pattern, path, should_ignore):
+    """Test that patterns follow gitignore glob semantics."""
+    (git_repo / ".gitignore").write_text(pattern + "\n")
+    assert IgnorePatternManager(git_repo).should_ignore(path) == should_ignore
+
+
+def test_nested_gitignore_scope(git_repo):
+    """Test that nested patterns are anchored to, and only apply below, their directory."""
+    (git_repo / "sub").mkdir()
+    (git_repo / "sub/.gitignore").write_text("/gen\n**\n")
+    manager = IgnorePatternManager(git_repo)
+
+    assert manager.should_ignore("sub/gen")
+    assert not manager.should_ignore("gen")
+    # A directory's own ignore file does not apply to the directory itself
+    assert not manager.should_ignore_dir("sub")
+
+
+NESTED_NEGATION_PATHS = {
+    "keep.log": True,
+    "src/keep.log": False,  # Deeper ignore files take precedence
+    "src/debug.log": True,
+    "src/lib/keep.log": True,
+    "src/lib/main.ml": False,
+    "src/gen/": True,
+    "src/gen/keep.log": True,  # Inside an ignored directory
+}
+NESTED_NEGATION_TREE = {
+    ".gitignore": "*.log\ngen/\n",
+    "src/.gitignore": "!keep.log\n",
+    "src/lib/.gitignore": "keep.log\n",
+    "src/gen/keep.log": None,  # Git only applies gen/ to actual directories
+}
+
+
+def test_nested_negation(tmp_path):
+    """Test that deeper ignore files override shallower ones, as git does."""
+    _build_tree(tmp_path, NESTED_NEGATION_TREE)
+    _fake_git_root(tmp_path)
+    manager = IgnorePatternManager(tmp_path)
+
+    for path, ignored in NESTED_NEGATION_PATHS.items():
+        assert manager.should_ignore(path) == ignored, path
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+def test_nested_negation_matches_git(tmp_path):
+    """Test the expected results of test_nested_negation against git itself."""
+    subprocess.run(["git", "init", "-q", str(tmp_path)], check=True)
+    _build_tree(tmp_path, NESTED_NEGATION_TREE)
+    paths = [path.rstrip("/") for path in NESTED_NEGATION_PATHS]
+    # --verbose --non-matching lists every path, with its deciding pattern
+    result = subprocess.run(
+        ["git", "check-ignore", "--no-index", "-v", "-n", "--stdin"],
+        cwd=tmp_path,
+        input="\n".join(paths) + "\n",
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode in (0, 1), result.stderr
+    ignored_by_git = {}
+    for line in result.stdout.splitlines():
+        source, path = line.split("\t", 1)
+        pattern = source.split(":", 2)[2]
+        ignored_by_git[path] = bool(pattern) and not pattern.startswith("!")
+    # Git only reports the patterns matching a path itself
+    ignored_by_git["src/gen/keep.log"] = ignored_by_git["src/gen"]
+
+    expected = {path.rstrip("/"): v for path, v in NESTED_NEGATION_PATHS.items()}
+    assert ignored_by_git == expected
+
+
+def test_pattern_runs(git_repo):
+    """Test that combined pattern runs keep last-match-wins precedence."""
+    (git_repo / ".gitignore").write_text("*.log\n*.tmp\n!keep.*\nkeep.tmp\n")
+    manager = IgnorePatternManager(git_repo)
+
+    assert manager.should_ignore("a.log")
+    assert not manager.should_ignore("keep.log")
+    assert manager.should_ignore("keep.tmp")
+    # One regex per run of same-polarity patterns
+    assert len(manager._runs_by_dir[""]) == 3
+
+
+def test_literal_pattern_runs(git_repo):
+    """Test that literal names are matched per component, keeping precedence."""
+    (git_repo / ".gitignore").write_text("node_modules\nbuild/\n*.log\n!keep.log\n")
+    manager = IgnorePatternManager(git_repo)
+
+    names, dir_names, regex = manager._runs_by_dir[""][1][1:]
+    assert names == {"node_modules"} and dir_names == {"build"}
+    assert manager.should_ignore("web/node_modules/x.js")
+    assert manager.should_ignore("node_modules")
+    assert manager.should_ignore("src/build/out.ml")
+    assert not manager.should_ignore("src/build")
+    assert manager.should_ignore("debug.log")
+    assert not manager.should_ignore("keep.log")
+
+
 # Test pattern matching
 @pytest.mark.parametrize(
     "path,should_ignore",
@@ -849,25 +1129,7 @@ def test_file_discovery(tmp_path, code_mapper):
         ("normal.txt", False),  # Non-matching file
     ],
 )
-def test_should_ignore(git_repo, ignore_manager, path, should_ignore):
+def test_should_ignore(ignore_manager, path, should_ignore):
     """Test pattern matching for various file paths."""
-    # Create standard ignore files first
-    (git_repo / ".gitignore").write_text(
-        """
-*.pyc
-/dist/
-!important.pyc
-""".strip()
-    )
-
-    # Create nested ignore files
-    (git_repo / "src").mkdir(exist_ok=True)
-    (git_repo / "src/lib").mkdir(exist_ok=True)
-    (git_repo / "src/lib/.gitignore").write_text(
-        """
-temp/
-*.log
-""".strip()
-    )
-
+    # The fixture wrote the root and src/lib ignore files
     assert ignore_manager.should_ignore(Path(path)) == should_ignore